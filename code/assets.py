@@ -0,0 +1,184 @@
+from os.path import join, normpath
+from os import walk
+from threading import Thread
+import pygame
+
+
+class Assets:
+    # process wide cache of loaded assets, keyed by (kind, args); a new
+    # GameView or Player reuses whatever an earlier one already loaded
+    def __init__(self):
+        self.cache = {}
+        self.atlas = None
+
+        # files decoded on the preload thread, by (kind, path), waiting for
+        # the main thread to finish them on first use (see preload)
+        self.raw = {}
+        self.decoded = set()
+        self.preload_thread = None
+
+    def get(self, kind, key, loader):
+        cache_key = (kind, key)
+        if cache_key not in self.cache:
+            self.cache[cache_key] = loader()
+        return self.cache[cache_key]
+
+    def evict(self, kind=None):
+        if kind is None:
+            self.wait()
+            self.cache.clear()
+            self.raw.clear()
+            self.decoded.clear()
+        else:
+            for cache_key in [
+                cache_key for cache_key in self.cache if cache_key[0] == kind
+            ]:
+                del self.cache[cache_key]
+
+    def preload(self, requests):
+        # decode files on a worker thread while a menu is up, so the GameView
+        # built after it finds them ready. requests are (kind, path) pairs as
+        # passed to image(), frames(), frame_folders(), sound() and map() (plus
+        # ("atlas", ()) for the atlas pages not loaded yet), or
+        # a function returning them that runs on the thread as well; only the
+        # parts that don't need the display run there, the main thread still
+        # converts images on first use. No thread starts when everything
+        # requested is loaded already.
+        self.wait()
+        if not callable(requests):
+            requests = [request for request in requests if not self.loaded(*request)]
+            if not requests:
+                return
+        self.preload_thread = Thread(target=self.decode, args=(requests,), daemon=True)
+        self.preload_thread.start()
+
+    def decode(self, requests):
+        from map_cache import load_compiled
+
+        if callable(requests):
+            requests = requests()
+        for kind, path in requests:
+            if self.loaded(kind, path):
+                continue
+            try:
+                if kind == "image":
+                    self.decode_image(path)
+                elif kind == "frames":
+                    for file_name in self.frame_names(*path):
+                        self.decode_image((*path, file_name))
+                elif kind == "frame_folders":
+                    for folder in next(walk(join(*path)))[1]:
+                        for file_name in self.frame_names(*path, folder):
+                            self.decode_image((*path, folder, file_name))
+                elif kind == "atlas" and self.atlas:
+                    for page_path in self.atlas.unloaded_pages():
+                        self.raw[("image", (page_path,))] = pygame.image.load(page_path)
+                elif kind == "sound":
+                    self.raw[(kind, path)] = pygame.mixer.Sound(join(*path))
+                elif kind == "map":
+                    self.raw[(kind, path)] = load_compiled(join(*path))
+                self.decoded.add((kind, path))
+            except (OSError, pygame.error):
+                # left for the main thread, which reports it on first use
+                pass
+
+    def loaded(self, kind, path):
+        # whether a preload request is cached or decoded already; requests
+        # for several files (and images found in the atlas) count as decoded
+        # once the preload thread has been through them
+        if (kind, path) in self.decoded:
+            return True
+        if kind == "atlas":
+            return not (self.atlas and self.atlas.unloaded_pages())
+        return (kind, path) in self.cache or (kind, path) in self.raw
+
+    def decode_image(self, path):
+        # images packed into the atlas are decoded already
+        if not (self.atlas and normpath(join(*path)) in self.atlas):
+            self.raw[("image", path)] = pygame.image.load(join(*path))
+
+    def take(self, kind, path):
+        # what the preload thread decoded for (kind, path), or None; waits
+        # for the thread when it may still be working on it
+        if self.preload_thread and (kind, path) not in self.raw:
+            self.wait()
+        return self.raw.pop((kind, path), None)
+
+    def wait(self):
+        if self.preload_thread:
+            self.preload_thread.join()
+            self.preload_thread = None
+
+    def use_atlas(self, atlas):
+        # images packed into the atlas are handed out as sub-surfaces of its pages
+        self.atlas = atlas
+        self.evict()
+
+    def image(self, *path):
+        def load():
+            atlas_path = normpath(join(*path))
+            if self.atlas and atlas_path in self.atlas:
+                return self.atlas.image(atlas_path)
+            surf = self.take("image", path) or pygame.image.load(join(*path))
+            return surf.convert_alpha()
+
+        return self.get("image", path, load)
+
+    def frames(self, *path):
+        # numbered frames (0.png, 1.png, ...) of one animation folder
+        return self.get(
+            "frames",
+            path,
+            lambda: [
+                self.image(*path, file_name) for file_name in self.frame_names(*path)
+            ],
+        )
+
+    def frame_names(self, *path):
+        _, _, file_names = next(walk(join(*path)))
+        file_names = [name for name in file_names if name.endswith(".png")]
+        return sorted(file_names, key=lambda name: int(name.split(".")[0]))
+
+    def frame_folders(self, *path):
+        # {sub folder name: frames} for a folder of animations
+        def load():
+            _, folders, _ = next(walk(join(*path)))
+            return {folder: self.frames(*path, folder) for folder in folders}
+
+        return self.get("frame_folders", path, load)
+
+    def masks(self, *path):
+        # collision masks matching self.frames(*path)
+        return self.get(
+            "masks", path, lambda: [pygame.mask.from_surface(surf) for surf in self.frames(*path)]
+        )
+
+    def silhouette(self, *path):
+        # white cut-out of the first frame, shown while an enemy dies
+        def load():
+            surf = self.masks(*path)[0].to_surface()
+            surf.set_colorkey("black")
+            return surf
+
+        return self.get("silhouette", path, load)
+
+    def sound(self, *path):
+        return self.get(
+            "sound",
+            path,
+            lambda: self.take("sound", path) or pygame.mixer.Sound(join(*path)),
+        )
+
+    def font(self, name, size):
+        return self.get("font", (name, size), lambda: pygame.font.Font(name, size))
+
+    def map(self, *path):
+        # compiled map data (see map_cache.py), which loads its tiles through here
+        from map_cache import load_map
+
+        return self.get(
+            "map", path, lambda: load_map(join(*path), self.take("map", path))
+        )
+
+
+assets = Assets()
@@ -0,0 +1,129 @@
+import json
+import os
+from os.path import join, normpath
+
+import pygame
+
+from assets import assets
+from map_cache import CACHE_DIR, source_stamps
+
+ATLAS_VERSION = 1
+PAGE_SIZE = 2048
+
+# every image the game draws: tiles, map objects, enemy/player frames, bullet
+ATLAS_FOLDERS = (join("data", "graphics"), "images")
+
+
+def atlas_sources():
+    sources = []
+    for folder in ATLAS_FOLDERS:
+        for folder_path, _, file_names in os.walk(folder):
+            for file_name in file_names:
+                if file_name.endswith(".png"):
+                    sources.append(normpath(join(folder_path, file_name)))
+    return sorted(sources)
+
+
+def pack(sizes):
+    # shelf packing, tallest first: fill a row left to right, start a new row
+    # below it when the width runs out and a new page when the height does
+    placements = {}
+    page, x, y, shelf_height = 0, 0, 0, 0
+    for path, (width, height) in sorted(sizes.items(), key=lambda item: -item[1][1]):
+        if x + width > PAGE_SIZE:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        if y + height > PAGE_SIZE:
+            page, x, y, shelf_height = page + 1, 0, 0, 0
+        placements[path] = (page, x, y, width, height)
+        x += width
+        shelf_height = max(shelf_height, height)
+    return placements
+
+
+class Atlas:
+    # a few large page surfaces plus a lookup of where each source image sits;
+    # pages from the cache (None in pages) are loaded when first drawn from,
+    # so the menus come up without them
+    def __init__(self, pages, placements, page_paths=()):
+        self.pages = pages
+        self.page_paths = page_paths
+        self.placements = placements
+
+    def __contains__(self, path):
+        return path in self.placements
+
+    def page(self, index):
+        if self.pages[index] is None:
+            # decoded on the preload thread if it got to it (see Assets.preload)
+            path = self.page_paths[index]
+            surf = assets.take("image", (path,)) or pygame.image.load(path)
+            self.pages[index] = surf.convert_alpha()
+        return self.pages[index]
+
+    def unloaded_pages(self):
+        return [path for page, path in zip(self.pages, self.page_paths) if page is None]
+
+    def image(self, path):
+        page, x, y, width, height = self.placements[path]
+        return self.page(page).subsurface((x, y, width, height))
+
+
+def index_path(name):
+    return join(CACHE_DIR, f"{name}_atlas.json")
+
+
+def page_path(name, page):
+    return join(CACHE_DIR, f"{name}_atlas_{page}.png")
+
+
+def build_atlas(name, sources):
+    # convert_alpha turns colorkeyed images into per pixel alpha first
+    images = {path: pygame.image.load(path).convert_alpha() for path in sources}
+    placements = pack({path: image.get_size() for path, image in images.items()})
+
+    page_count = max((page for page, *_ in placements.values()), default=-1) + 1
+    pages = [
+        pygame.Surface((PAGE_SIZE, PAGE_SIZE), pygame.SRCALPHA)
+        for _ in range(page_count)
+    ]
+    for path, (page, x, y, _, _) in placements.items():
+        # RGBA_MAX onto the cleared page copies pixels exactly, alpha included
+        pages[page].blit(images[path], (x, y), special_flags=pygame.BLEND_RGBA_MAX)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for page, surf in enumerate(pages):
+        pygame.image.save(surf, page_path(name, page))
+    with open(index_path(name), "w") as f:
+        json.dump(
+            {
+                "version": ATLAS_VERSION,
+                "sources": source_stamps(sources),
+                "pages": page_count,
+                "placements": placements,
+            },
+            f,
+        )
+    return Atlas([surf.convert_alpha() for surf in pages], placements)
+
+
+def load_atlas(name="sprites"):
+    # reuse the packed pages from an earlier launch while every source image
+    # is unchanged, otherwise pack them again
+    sources = atlas_sources()
+    try:
+        with open(index_path(name)) as f:
+            index = json.load(f)
+        stamps = {path: list(stamp) for path, stamp in source_stamps(sources).items()}
+        page_paths = [page_path(name, page) for page in range(index["pages"])]
+        if (
+            index["version"] == ATLAS_VERSION
+            and index["sources"] == stamps
+            and all(os.path.exists(path) for path in page_paths)
+        ):
+            placements = {
+                path: tuple(rect) for path, rect in index["placements"].items()
+            }
+            return Atlas([None] * len(page_paths), placements, page_paths)
+    except (OSError, ValueError, KeyError):
+        pass
+    return build_atlas(name, sources)
@@ -0,0 +1,199 @@
+import json
+import time
+from argparse import ArgumentParser
+from statistics import mean
+
+from main import Game
+from levels import LEVEL_DATA, Level, Wave
+from assets import assets
+from profiler import profiler
+
+# every scenario runs at this fixed timestep, so the same seed gives the same
+# simulation on every machine
+TICK_RATE = 60
+STRESS_SIZES = (100, 500, 2000)
+
+# profiler fields that are counts rather than section timings
+COUNT_FIELDS = (
+    "frame_ms",
+    "sprites",
+    "enemies",
+    "far_enemies",
+    "bullets",
+    "allocated_blocks",
+)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def single_wave_level(wave):
+    # a level holding one wave, long enough to cover the whole run
+    return Level(waves=[wave])
+
+
+def run_scenario(game, level, ticks, stress=0, seed=0):
+    game.seed = seed
+    game.current_level_index = 0
+    game.change_state("game")
+    game_view = game.state
+    game_view.load_level(level)
+
+    # keep the player alive so every scenario runs to the end
+    game_view.player.max_hp = game_view.player.hp = 10**9
+
+    if stress:
+        # constant fire and a crowd topped back up to `stress` every tick
+        game_view.gun_cooldown = 0
+        enemy_type = level.waves[0].enemy_type
+
+    # per subsystem timings come from the built-in frame profiler
+    profiler.enabled = True
+    profiler.end_frame()
+    frame_times = []
+    section_times = {}
+    pools = {}
+    dt = 1 / TICK_RATE
+    for _ in range(ticks):
+        if stress:
+            for _ in range(stress - len(game_view.enemy_sprites)):
+                game_view.spawn_enemy(
+                    enemy_type, game_view.rng.choice(game_view.spawn_positions)
+                )
+
+        start = time.perf_counter()
+        game_view.update(dt)
+        game_view.draw(game.display_surface)
+        frame_times.append(time.perf_counter() - start)
+
+        profiler.end_frame()
+        for section, ms in profiler.history[-1].items():
+            if "_pool." in section:
+                # sprite pool size, in use and high water, as of the last tick
+                pools[section] = ms
+            elif section not in COUNT_FIELDS:
+                section_times.setdefault(section, []).append(ms)
+
+        if game.state is not game_view:
+            break
+
+    profiler.enabled = False
+    draw_seconds = sum(
+        sum(section_times.get(section, ())) for section in ("all_sprites.draw", "hud")
+    )
+    update_seconds = sum(frame_times) - draw_seconds / 1000
+    return {
+        "ticks": len(frame_times),
+        "enemies_at_end": len(game_view.enemy_sprites),
+        "frame_ms": {
+            "mean": mean(frame_times) * 1000,
+            "p50": percentile(frame_times, 0.50) * 1000,
+            "p95": percentile(frame_times, 0.95) * 1000,
+            "p99": percentile(frame_times, 0.99) * 1000,
+        },
+        "section_ms": {
+            section: sum(times) / len(frame_times)
+            for section, times in section_times.items()
+        },
+        "pools": pools,
+        "sim_ticks_per_second": (
+            len(frame_times) / update_seconds if update_seconds else 0
+        ),
+    }
+
+
+def measure_load(game):
+    # cold: empty asset cache, so the map, images and sounds are loaded;
+    # warm: a second GameView reusing the cache, like a level restart
+    assets.evict()
+    start = time.perf_counter()
+    game.change_state("game")
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    game.change_state("game")
+    warm = time.perf_counter() - start
+    return {"cold_ms": cold * 1000, "warm_ms": warm * 1000}
+
+
+def scenarios(ticks):
+    empty = Wave(duration=10**6, spawn_interval=10**9, enemy_type="bat", spawn_amount=0)
+    yield "empty", single_wave_level(empty), ticks, 0
+
+    for level_index, level in enumerate(LEVEL_DATA):
+        for wave_index, wave in enumerate(level.waves):
+            # run each wave for its full duration
+            wave = Wave(
+                wave.duration, wave.spawn_interval, wave.enemy_type, wave.spawn_amount
+            )
+            wave_ticks = wave.duration * TICK_RATE
+            wave.duration = 10**6
+            name = f"level{level_index + 1}_wave{wave_index + 1}"
+            yield name, single_wave_level(wave), wave_ticks, 0
+
+    for size in STRESS_SIZES:
+        stress = Wave(
+            duration=10**6, spawn_interval=10**9, enemy_type="bat", spawn_amount=0
+        )
+        yield f"stress_{size}", single_wave_level(stress), ticks, size
+
+
+def compare(results, baseline):
+    print(f"\n{'scenario':<20}{'p50 ms':>10}{'baseline':>10}{'change':>9}")
+    for name, result in results["scenarios"].items():
+        if name not in baseline.get("scenarios", {}):
+            continue
+        current = result["frame_ms"]["p50"]
+        previous = baseline["scenarios"][name]["frame_ms"]["p50"]
+        change = (current - previous) / previous * 100 if previous else 0
+        print(f"{name:<20}{current:>10.2f}{previous:>10.2f}{change:>+8.1f}%")
+
+
+def parse_args():
+    parser = ArgumentParser(description="Headless benchmarks for the game loop")
+    parser.add_argument("--ticks", type=int, default=600, help="ticks per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="scenario names to run")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    game = Game(headless=True, fixed_dt=1 / TICK_RATE)
+    results = {
+        "meta": {"tick_rate": TICK_RATE, "ticks": args.ticks, "seed": args.seed},
+        "load": measure_load(game),
+        "scenarios": {},
+    }
+    print(
+        f"load: {results['load']['cold_ms']:.1f} ms cold, {results['load']['warm_ms']:.1f} ms warm"
+    )
+
+    for name, level, ticks, stress in scenarios(args.ticks):
+        if args.only and name not in args.only:
+            continue
+        result = run_scenario(game, level, ticks, stress, args.seed)
+        results["scenarios"][name] = result
+        frame_ms = result["frame_ms"]
+        sections = ", ".join(
+            f"{section} {ms:.2f}" for section, ms in result["section_ms"].items()
+        )
+        print(
+            f"{name}: p50 {frame_ms['p50']:.2f} ms, p95 {frame_ms['p95']:.2f} ms, "
+            f"p99 {frame_ms['p99']:.2f} ms ({sections})"
+        )
+        pools = ", ".join(f"{field} {value}" for field, value in result["pools"].items())
+        print(f"{name} pools: {pools}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
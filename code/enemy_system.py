@@ -0,0 +1,347 @@
+from settings import *
+from pool import SpritePool
+
+try:
+    import numpy as np
+except ImportError:  # optional, GameView falls back to per-object Enemy sprites
+    np = None
+
+
+class EnemyProxy(pygame.sprite.Sprite):
+    # thin sprite view of one EnemySystem slot, so drawing and the collision
+    # code in GameView keep working through the regular groups
+    __slots__ = ("system", "index", "mask", "xp_value", "pool")
+
+    def __init__(self, system, index, image, mask, groups):
+        super().__init__()
+        self.pool = None
+        self.xp_value = 10
+        self.reset(system, index, image, mask, groups)
+
+    def reset(self, system, index, image, mask, groups):
+        self.system = system
+        self.index = index
+        self.image = image
+        self.mask = mask
+        self.rect = self.image.get_frect()
+        self.add(groups)
+
+    def destroy(self):
+        self.system.destroy(self.index)
+
+    def kill(self):
+        if self.alive():
+            super().kill()
+            self.system.release(self)
+            if self.pool:
+                self.pool.release(self)
+
+
+class EnemySystem:
+    # structure-of-arrays enemy simulation: every enemy of every wave is a row
+    # in the arrays below and is advanced in one vectorized step per tick
+    def __init__(self, player, obstacles, flow_field, clock, capacity = 256):
+        self.player = player
+        self.flow_field = flow_field
+        self.clock = clock
+        self.speed = 200
+        self.animation_speed = 6
+        self.death_duration = 400
+
+        # static obstacles as (left, top, right, bottom) columns, plus one
+        # that overlaps nothing to pad the obstacle hash with
+        self.obstacles = np.array(
+            [(rect.left, rect.top, rect.right, rect.bottom) for rect in obstacles]
+            + [(np.inf, np.inf, -np.inf, -np.inf)],
+            dtype = float,
+        )
+        self.hash_obstacles()
+
+        # per enemy type frame tables, indexed by self.kind
+        self.kinds = {}
+        self.kind_frames = []
+        self.kind_masks = []
+        self.kind_death_surfs = []
+
+        self.proxy_pool = SpritePool(EnemyProxy)
+        self.proxies = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        self.capacity = capacity
+        self.pos = np.zeros((capacity, 2))
+        self.half_size = np.zeros((capacity, 2))
+        self.frame_index = np.zeros(capacity)
+        self.frame = np.zeros(capacity, dtype = int)
+        self.frame_count = np.ones(capacity, dtype = int)
+        self.kind = np.zeros(capacity, dtype = int)
+        self.death_time = np.zeros(capacity)
+        self.alive = np.zeros(capacity, dtype = bool)
+
+    def hash_obstacles(self, cell_size = TILE_SIZE * 2):
+        # per grid cell, the obstacles touching it as one row of a table
+        # padded with the empty obstacle; the last row, for cells outside the
+        # grid, holds only padding. Hitboxes are smaller than a cell, so the
+        # cells under their four corners are all the cells they touch.
+        self.obstacle_cell_size = cell_size
+        obstacles = self.obstacles[:-1]
+        empty = len(obstacles)
+        if not empty:
+            self.obstacle_origin = np.zeros(2, dtype = int)
+            self.obstacle_grid_size = np.zeros(2, dtype = int)
+            self.obstacle_table = np.full((1, 1), empty)
+            return
+        low = (obstacles[:, :2] // cell_size).astype(int)
+        high = (obstacles[:, 2:] // cell_size).astype(int)
+        origin = low.min(axis = 0)
+        width, height = high.max(axis = 0) - origin + 1
+        buckets = [[] for _ in range(width * height)]
+        for index, ((left, top), (right, bottom)) in enumerate(
+            zip((low - origin).tolist(), (high - origin).tolist())
+        ):
+            for y in range(top, bottom + 1):
+                for x in range(left, right + 1):
+                    buckets[y * width + x].append(index)
+
+        table = np.full(
+            (len(buckets) + 1, max(len(bucket) for bucket in buckets)), empty
+        )
+        for row, bucket in enumerate(buckets):
+            table[row, : len(bucket)] = bucket
+        self.obstacle_origin = origin
+        self.obstacle_grid_size = np.array((width, height))
+        self.obstacle_table = table
+
+    def nearby_obstacles(self, left, top, right, bottom):
+        # obstacle indices in the cells under each box's corners, one row per box
+        cell_size = self.obstacle_cell_size
+        origin_x, origin_y = self.obstacle_origin
+        width, height = self.obstacle_grid_size
+        outside = len(self.obstacle_table) - 1
+        rows = []
+        for x, y in ((left, top), (right, top), (left, bottom), (right, bottom)):
+            cell_x = (x // cell_size).astype(int) - origin_x
+            cell_y = (y // cell_size).astype(int) - origin_y
+            inside = (
+                (cell_x >= 0) & (cell_x < width) & (cell_y >= 0) & (cell_y < height)
+            )
+            rows.append(np.where(inside, cell_y * width + cell_x, outside))
+        return self.obstacle_table[np.column_stack(rows)].reshape(len(left), -1)
+
+    def grow(self):
+        old_capacity = self.capacity
+        arrays = (self.pos, self.half_size, self.frame_index, self.frame, self.frame_count, self.kind, self.death_time, self.alive)
+        self.allocate(old_capacity * 2)
+        for new, old in zip((self.pos, self.half_size, self.frame_index, self.frame, self.frame_count, self.kind, self.death_time, self.alive), arrays):
+            new[:old_capacity] = old
+        self.proxies.extend([None] * old_capacity)
+        self.free.extend(range(self.capacity - 1, old_capacity - 1, -1))
+
+    def kind_id(self, frames, masks, death_surf):
+        key = id(frames)
+        if key not in self.kinds:
+            self.kinds[key] = len(self.kind_frames)
+            self.kind_frames.append(frames)
+            self.kind_masks.append(masks)
+            self.kind_death_surfs.append(death_surf)
+        return self.kinds[key]
+
+    def spawn(self, pos, frames, masks, death_surf, groups):
+        if not self.free:
+            self.grow()
+        index = self.free.pop()
+
+        proxy = self.proxy_pool.acquire(self, index, frames[0], masks[0], groups)
+        proxy.rect.center = pos
+        hitbox_rect = proxy.rect.inflate(-20, -40)
+        self.proxies[index] = proxy
+
+        self.pos[index] = hitbox_rect.center
+        self.half_size[index] = (hitbox_rect.width / 2, hitbox_rect.height / 2)
+        self.frame_index[index] = 0
+        self.frame[index] = 0
+        self.frame_count[index] = len(frames)
+        self.kind[index] = self.kind_id(frames, masks, death_surf)
+        self.death_time[index] = 0
+        self.alive[index] = True
+        return proxy
+
+    def destroy(self, index):
+        self.death_time[index] = self.clock.get_ticks()
+        proxy = self.proxies[index]
+        kind = self.kind[index]
+        proxy.image = self.kind_death_surfs[kind]
+        proxy.mask = self.kind_masks[kind][0]
+
+    def release(self, proxy):
+        index = proxy.index
+        if self.proxies[index] is proxy:
+            self.alive[index] = False
+            self.proxies[index] = None
+            self.free.append(index)
+
+    def collide(self, axis, moving):
+        # push moving hitboxes out of the obstacles they overlap along one axis
+        if len(self.obstacles) == 1 or not len(moving):
+            return
+        pos, half_size = self.pos[moving], self.half_size[moving]
+        left, top = (pos - half_size).T
+        right, bottom = (pos + half_size).T
+        # only the obstacles hashed near each hitbox, padding overlaps nothing
+        nearby = self.obstacles[self.nearby_obstacles(left, top, right, bottom)]
+        overlap = (
+            (left[:, None] < nearby[:, :, 2])
+            & (right[:, None] > nearby[:, :, 0])
+            & (top[:, None] < nearby[:, :, 3])
+            & (bottom[:, None] > nearby[:, :, 1])
+        )
+        hit = np.flatnonzero(overlap.any(axis = 1))
+        if not len(hit):
+            return
+
+        overlap, nearby = overlap[hit], nearby[hit]
+        low_edge, high_edge = (
+            (nearby[:, :, 0], nearby[:, :, 2])
+            if axis == 0
+            else (nearby[:, :, 1], nearby[:, :, 3])
+        )
+        nearest_low = np.where(overlap, low_edge, np.inf).min(axis = 1)
+        nearest_high = np.where(overlap, high_edge, -np.inf).max(axis = 1)
+        step = self.direction[moving[hit], axis]
+        new_pos = pos[hit, axis]
+        forward = step > 0
+        backward = step < 0
+        new_pos[forward] = nearest_low[forward] - half_size[hit[forward], axis]
+        new_pos[backward] = nearest_high[backward] + half_size[hit[backward], axis]
+        self.pos[moving[hit], axis] = new_pos
+
+    def separation(self, pos):
+        # bucket positions into SEPARATION_RADIUS cells by sorting on the cell
+        # key, then look at up to SEPARATION_NEIGHBOURS others in the 3x3
+        # surrounding cells, for every enemy at once. The three cells of one
+        # column are a single run of the sorted keys, and each enemy walks a
+        # run starting just past its own place in the sort order, so a crowded
+        # cell isn't judged by the same first few members every time
+        push = np.zeros_like(pos)
+        count = len(pos)
+        if count < 2:
+            return push
+        cells = (pos // SEPARATION_RADIUS).astype(np.int64)
+        keys = (cells[:, 0] << 32) + cells[:, 1]
+        order = np.argsort(keys, kind = "stable")
+        sorted_keys = keys[order]
+        place = np.empty(count, dtype = np.int64)
+        place[order] = np.arange(count)
+
+        # how many members of each column run every enemy looks at, taken
+        # column by column
+        starts, sizes, takes = [], [], []
+        taken = np.zeros(count, dtype = np.int64)
+        for dx in (0, -1, 1):
+            column_keys = ((cells[:, 0] + dx) << 32) + cells[:, 1]
+            start = np.searchsorted(sorted_keys, column_keys - 1, "left")
+            size = np.searchsorted(sorted_keys, column_keys + 1, "right") - start
+            take = np.minimum(size, SEPARATION_NEIGHBOURS - taken)
+            taken += take
+            starts.append(start)
+            sizes.append(size)
+            takes.append(take)
+
+        # then all (enemy, neighbour) pairs in one go: the n-th member looked
+        # at in a run is n places past the enemy's own place, wrapping around
+        takes = np.concatenate(takes)
+        rows = np.repeat(np.tile(np.arange(count), 3), takes)
+        start = np.repeat(np.concatenate(starts), takes)
+        size = np.repeat(np.concatenate(sizes), takes)
+        slot = np.arange(len(rows)) - np.repeat(np.cumsum(takes) - takes, takes) + 1
+        other = order[start + (place[rows] - start + slot) % size]
+        offset = pos[rows] - pos[other]
+        distance = np.hypot(offset[:, 0], offset[:, 1])
+
+        # stacked exactly (say, wedged into the same corner): split sideways,
+        # each way by index
+        stacked = (distance == 0) & (rows != other)
+        push[:, 0] += np.bincount(
+            rows[stacked],
+            np.sign(rows[stacked] - other[stacked]) * SEPARATION_RADIUS,
+            count,
+        )
+        near = (distance > 0) & (distance < SEPARATION_RADIUS)
+        rows, offset, distance = rows[near], offset[near], distance[near]
+        weight = (SEPARATION_RADIUS - distance) / distance
+        push[:, 0] += np.bincount(rows, offset[:, 0] * weight, count)
+        push[:, 1] += np.bincount(rows, offset[:, 1] * weight, count)
+        return push / SEPARATION_RADIUS
+
+    def update(self, dt):
+        moving = np.flatnonzero(self.alive & (self.death_time == 0))
+
+        # seek the player, or the flow field's next cell wherever it has one
+        pos = self.pos[moving]
+        target = np.empty_like(pos)
+        target[:] = self.player.rect.center
+        field = self.flow_field
+        cells = (pos // field.cell_size).astype(int)
+        inside = np.flatnonzero(
+            (cells[:, 0] >= 0)
+            & (cells[:, 0] < field.width)
+            & (cells[:, 1] >= 0)
+            & (cells[:, 1] < field.height)
+        )
+        next_cell = np.frombuffer(field.next_cell, dtype = np.intc)[
+            cells[inside, 1] * field.width + cells[inside, 0]
+        ]
+        steered = next_cell >= 0
+        next_cell = next_cell[steered]
+        target[inside[steered]] = (
+            np.column_stack((next_cell % field.width, next_cell // field.width)) + 0.5
+        ) * field.cell_size
+
+        delta = target - pos
+        length = np.hypot(delta[:, 0], delta[:, 1])
+        length[length == 0] = 1
+        direction = delta / length[:, None]
+
+        # plus a push away from crowded neighbours
+        direction += self.separation(pos) * SEPARATION_WEIGHT
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        length[length == 0] = 1
+        self.direction = np.zeros((self.capacity, 2))
+        self.direction[moving] = direction / length[:, None]
+
+        # move + collide one axis at a time, like the sprite version
+        step = self.direction[moving] * (self.speed * dt)
+        self.pos[moving, 0] += step[:, 0]
+        self.collide(0, moving)
+        self.pos[moving, 1] += step[:, 1]
+        self.collide(1, moving)
+
+        # animation frame selection
+        self.frame_index[moving] += self.animation_speed * dt
+        frame = self.frame_index[moving].astype(int) % self.frame_count[moving]
+        changed = moving[frame != self.frame[moving]]
+        self.frame[moving] = frame
+
+        # write the results back to the sprite proxies: positions of the ones
+        # that moved, images of the ones on a new frame
+        proxies, kind_frames, kind_masks = (
+            self.proxies,
+            self.kind_frames,
+            self.kind_masks,
+        )
+        moved = moving[(self.pos[moving] != pos).any(axis = 1)]
+        for index, center in zip(moved.tolist(), self.pos[moved].tolist()):
+            proxies[index].rect.center = center
+        for index, frame, kind in zip(
+            changed.tolist(), self.frame[changed].tolist(), self.kind[changed].tolist()
+        ):
+            proxy = proxies[index]
+            proxy.image = kind_frames[kind][frame]
+            proxy.mask = kind_masks[kind][frame]
+
+        # finished death animations
+        dying = self.alive & (self.death_time > 0)
+        expired = np.flatnonzero(dying & (self.clock.get_ticks() - self.death_time >= self.death_duration))
+        for index in expired.tolist():
+            self.proxies[index].kill()
@@ -0,0 +1,149 @@
+import copy
+from array import array
+from collections import deque
+
+from settings import *
+
+# neighbour offsets, orthogonal first; diagonals may not cut obstacle corners
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1))
+
+
+class FlowField:
+    # one grid of waypoints towards the player, shared by every enemy: rebuilt
+    # with a breadth first search whenever the player enters a new cell, then
+    # sampled per enemy with a single lookup
+    def __init__(self, width, height, obstacles, agent_size, cell_size=TILE_SIZE):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+
+        # a cell is blocked when an enemy hitbox centred on it would overlap
+        # an obstacle, i.e. the obstacle grown by the hitbox covers its centre
+        self.blocked = bytearray(width * height)
+        for rect in obstacles:
+            rect = rect.inflate(agent_size)
+            left = max(0, int((rect.left - cell_size / 2) // cell_size) + 1)
+            top = max(0, int((rect.top - cell_size / 2) // cell_size) + 1)
+            right = min(width - 1, int((rect.right - cell_size / 2) // cell_size))
+            bottom = min(height - 1, int((rect.bottom - cell_size / 2) // cell_size))
+            for y in range(top, bottom + 1):
+                for x in range(left, right + 1):
+                    self.blocked[y * width + x] = 1
+
+        # the walkable neighbours of every cell never change, so they are
+        # listed once as (index, dx, dy)
+        self.neighbours = [
+            [
+                ((y + dy) * width + x + dx, dx, dy)
+                for dx, dy in NEIGHBOURS
+                if self.passable(x, y, dx, dy)
+            ]
+            for y in range(height)
+            for x in range(width)
+        ]
+        self.centres = [
+            pygame.Vector2((x + 0.5) * cell_size, (y + 0.5) * cell_size)
+            for y in range(height)
+            for x in range(width)
+        ]
+
+        # per cell, the index of the next cell on the way to the player; -1
+        # means head straight for the player (their own cell, unreachable cells)
+        self.next_cell = array("i", [-1]) * (width * height)
+        self.target = None
+
+    def copy(self):
+        # a field with its own paths over the same grid; the blocked cells,
+        # neighbours and centres are shared
+        field = copy.copy(self)
+        field.next_cell = array("i", [-1]) * (self.width * self.height)
+        field.target = None
+        return field
+
+    def passable(self, x, y, dx, dy):
+        width, blocked = self.width, self.blocked
+        if not (0 <= x + dx < width and 0 <= y + dy < self.height):
+            return False
+        if blocked[(y + dy) * width + x + dx]:
+            return False
+        return not (dx and dy) or not (
+            blocked[y * width + x + dx] or blocked[(y + dy) * width + x]
+        )
+
+    def cell(self, pos):
+        x, y = int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return x, y
+        return None
+
+    def update(self, target_pos):
+        target = self.cell(target_pos)
+        if target == self.target:
+            return
+        self.target = target
+
+        width, neighbours = self.width, self.neighbours
+        distance = [-1] * len(neighbours)
+        next_cell = self.next_cell = array("i", [-1]) * len(neighbours)
+        if target is None:
+            return
+
+        # distances out from the player's cell, or from the nearest cell an
+        # enemy fits in when the player stands somewhere narrower
+        target_x, target_y = target
+        start = self.nearest_open(target_x, target_y)
+        if start is None:
+            return
+        distance[start] = 0
+        queue = deque((start,))
+        while queue:
+            index = queue.popleft()
+            next_distance = distance[index] + 1
+            for neighbour, _, _ in neighbours[index]:
+                if distance[neighbour] < 0:
+                    distance[neighbour] = next_distance
+                    queue.append(neighbour)
+
+        # every reached cell points at a neighbour one step closer, the one
+        # most in line with the player so paths don't zigzag
+        for index, cell_distance in enumerate(distance):
+            if cell_distance <= 0:
+                continue
+            closer = cell_distance - 1
+            to_x, to_y = target_x - index % width, target_y - index // width
+            best, best_dot = -1, None
+            for neighbour, dx, dy in neighbours[index]:
+                if distance[neighbour] == closer:
+                    dot = (dx * to_x + dy * to_y) / (dx * dx + dy * dy) ** 0.5
+                    if best_dot is None or dot > best_dot:
+                        best, best_dot = neighbour, dot
+            # stays -1 next to a player standing in a blocked cell
+            next_cell[index] = best
+
+    def nearest_open(self, x, y):
+        width, height, blocked = self.width, self.height, self.blocked
+        for radius in range(max(width, height)):
+            ring = [
+                (x + dx, y + dy)
+                for dy in range(-radius, radius + 1)
+                for dx in range(-radius, radius + 1)
+                if max(abs(dx), abs(dy)) == radius
+                and 0 <= x + dx < width
+                and 0 <= y + dy < height
+                and not blocked[(y + dy) * width + x + dx]
+            ]
+            if ring:
+                open_x, open_y = min(
+                    ring, key=lambda cell: (cell[0] - x) ** 2 + (cell[1] - y) ** 2
+                )
+                return open_y * width + open_x
+        return None
+
+    def waypoint(self, pos):
+        # the centre of the next cell to walk to, None to head straight for
+        # the player
+        cell = self.cell(pos)
+        if cell is None:
+            return None
+        next_cell = self.next_cell[cell[1] * self.width + cell[0]]
+        return self.centres[next_cell] if next_cell >= 0 else None
@@ -1,100 +1,223 @@
-from settings import WINDOW_WIDTH
+from settings import (
+    WINDOW_WIDTH,
+    WINDOW_HEIGHT,
+    NUMPY_ENEMIES,
+    NUMPY_PROJECTILES,
+    LOD_MARGIN,
+    LOD_INTERVAL,
+    SPAWN_BUDGET,
+)
 import pygame
-from os.path import join
-from os import walk
-from random import choice
-from pytmx.util_pygame import load_pygame
+from random import Random, randrange
 
-from settings import TILE_SIZE
+from assets import assets
+from text import TextLabel
 from views import State
-from player import Player
-from sprites import Bullet, Enemy, Sprite, CollisionSprite
-from groups import AllSprites
+from player import Player, PLAYER_FRAME_PATHS
+from sprites import Bullet, Enemy, CollisionSprite
+from groups import AllSprites, GroundChunks
+from spatial import SpatialHash
+from flow_field import FlowField
+from enemy_system import EnemySystem, np
+from projectile_system import ProjectileSystem
+from pool import SpritePool
+from sim_clock import SimClock
+from timer_wheel import TimerWheel
+from profiler import profiler
+from replay import LiveInput, RecordingInput
+from spawn_timeline import SpawnTimeline
 from levels import LEVEL_DATA
 
+# files a GameView loads
+MAP_PATH = ("data", "maps", "world.tmx")
+SHOOT_SOUND_PATH = ("audio", "shoot.wav")
+IMPACT_SOUND_PATH = ("audio", "impact.ogg")
+MUSIC_PATH = ("audio", "music.wav")
+BULLET_PATH = ("images", "gun", "bullet.png")
+ENEMY_FRAMES_PATH = ("images", "enemies")
+
+# the same, as the (kind, path) keys their loaders cache them under, decoded on
+# a worker thread while the main menu or the shop is open (see Assets.preload)
+PRELOAD = (
+    ("atlas", ()),
+    ("map", MAP_PATH),
+    ("sound", SHOOT_SOUND_PATH),
+    ("sound", IMPACT_SOUND_PATH),
+    ("sound", MUSIC_PATH),
+    ("image", BULLET_PATH),
+    ("frame_folders", ENEMY_FRAMES_PATH),
+    *(("frames", path) for path in PLAYER_FRAME_PATHS.values()),
+)
+
 
 class GameView(State):
     def __init__(self, game):
         super().__init__(game)
 
+        # simulation time, and the timers that run on it
+        self.clock = SimClock()
+        self.timers = TimerWheel()
+
+        # input and randomness: live, recorded for replay, or replayed
+        if self.game.replay:
+            self.controls = self.game.replay
+            header = self.controls.header
+            seed = header["seed"]
+            self.game.current_level_index = header["level"]
+            self.game.player_stats = dict(header["player_stats"])
+        else:
+            seed = self.game.seed if self.game.seed is not None else randrange(2**32)
+            if self.game.record_path:
+                self.controls = RecordingInput(
+                    {
+                        "seed": seed,
+                        "level": self.game.current_level_index,
+                        "player_stats": dict(self.game.player_stats),
+                    }
+                )
+            else:
+                self.controls = LiveInput()
+        self.rng = Random(seed)
+
         # groups
         self.all_sprites = AllSprites()
         self.collision_sprites = pygame.sprite.Group()
         self.bullet_sprites = pygame.sprite.Group()
         self.enemy_sprites = pygame.sprite.Group()
+        self.collision_grid = SpatialHash()
+        self.enemy_grid = SpatialHash()
+
+        # pools
+        self.bullet_pool = SpritePool(Bullet)
+        self.enemy_pool = SpritePool(Enemy)
+
+        # enemy level of detail: the screen plus a margin around the player,
+        # and a round robin over the enemies outside it
+        self.lod_rect = pygame.FRect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT).inflate(
+            LOD_MARGIN * 2, LOD_MARGIN * 2
+        )
+        self.lod_tick = 0
+        self.enemies_spawned = 0
 
         # gun timer
         self.can_shoot = True
-        self.shoot_time = 0
         self.gun_cooldown = 500
+        self.gun_pierce = 0
 
         # Level & Wave Management
-        self.level_data = LEVEL_DATA[
-            min(self.game.current_level_index, len(LEVEL_DATA) - 1)
-        ]
-        self.current_wave_index = 0
-        self.wave_start_time = pygame.time.get_ticks()
-        self.last_spawn_time = 0
+        self.load_level(
+            LEVEL_DATA[min(self.game.current_level_index, len(LEVEL_DATA) - 1)]
+        )
         self.spawn_positions = []
 
         # Audio
-        self.shoot_sound = pygame.mixer.Sound(join("audio", "shoot.wav"))
+        self.shoot_sound = assets.sound(*SHOOT_SOUND_PATH)
         self.shoot_sound.set_volume(self.game.sfx_volume)
-        self.impact_sound = pygame.mixer.Sound(join("audio", "impact.ogg"))
+        self.impact_sound = assets.sound(*IMPACT_SOUND_PATH)
         self.impact_sound.set_volume(self.game.sfx_volume)
-        self.music = pygame.mixer.Sound(join("audio", "music.wav"))
+        self.music = assets.sound(*MUSIC_PATH)
         self.music.set_volume(self.game.music_volume)
         # self.music.play(loops = -1)
 
+        # HUD
+        self.hud_font = assets.font(None, 30)
+        self.wave_label = TextLabel(self.hud_font, "white")
+        self.points_label = TextLabel(self.hud_font, "gold")
+
         # setup
         self.load_images()
         self.setup()
 
     def load_images(self):
-        self.bullet_surf = pygame.image.load(
-            join("images", "gun", "bullet.png")
-        ).convert_alpha()
-
-        folders = list(walk(join("images", "enemies")))[0][1]
-        self.enemy_frames = {}
-        for folder in folders:
-            for folder_path, _, file_names in walk(join("images", "enemies", folder)):
-                self.enemy_frames[folder] = []
-                for file_name in sorted(
-                    file_names, key=lambda name: int(name.split(".")[0])
-                ):
-                    full_path = join(folder_path, file_name)
-                    surf = pygame.image.load(full_path).convert_alpha()
-                    self.enemy_frames[folder].append(surf)
+        self.bullet_surf = assets.image(*BULLET_PATH)
+        self.bullet_mask = assets.get(
+            "mask", "bullet", lambda: pygame.mask.from_surface(self.bullet_surf)
+        )
+
+        # collide_mask rebuilds a mask from the image unless the sprite has one,
+        # so every frame comes with a cached mask (and a death silhouette)
+        self.enemy_frames = assets.frame_folders(*ENEMY_FRAMES_PATH)
+        self.enemy_masks = {}
+        self.enemy_death_surfs = {}
+        for folder in self.enemy_frames:
+            self.enemy_masks[folder] = assets.masks(*ENEMY_FRAMES_PATH, folder)
+            self.enemy_death_surfs[folder] = assets.silhouette(*ENEMY_FRAMES_PATH, folder)
 
     def setup(self):
-        map = load_pygame(join("data", "maps", "world.tmx"))
+        map = assets.map(*MAP_PATH)
 
-        for x, y, image in map.get_layer_by_name("Ground").tiles():
-            Sprite((x * TILE_SIZE, y * TILE_SIZE), image, self.all_sprites)
+        # the baked chunks never change, so they are shared like the map itself
+        self.all_sprites.ground = assets.get(
+            "ground",
+            MAP_PATH,
+            lambda: GroundChunks(map.ground_tiles()),
+        )
 
-        for obj in map.get_layer_by_name("Objects"):
-            CollisionSprite(
-                (obj.x, obj.y), obj.image, (self.all_sprites, self.collision_sprites)
-            )
+        for x, y, image in map.objects():
+            CollisionSprite((x, y), image, (self.all_sprites, self.collision_sprites))
 
-        for obj in map.get_layer_by_name("Collisions"):
+        for x, y, width, height in map.collisions():
             CollisionSprite(
-                (obj.x, obj.y),
-                pygame.Surface((obj.width, obj.height)),
+                (x, y),
+                pygame.Surface((width, height)),
                 self.collision_sprites,
             )
 
-        for obj in map.get_layer_by_name("Entities"):
-            if obj.name == "Player":
+        for sprite in self.collision_sprites:
+            self.collision_grid.insert(sprite, sprite.rect)
+
+        # the grid is the same for every level on this map, so later views
+        # copy it instead of building it again
+        self.flow_field = assets.get(
+            "flow_field",
+            MAP_PATH,
+            lambda: self.build_flow_field(map),
+        ).copy()
+
+        for name, x, y in map.entities():
+            if name == "Player":
                 self.player = Player(
-                    (obj.x, obj.y),
+                    (x, y),
                     self.all_sprites,
-                    self.collision_sprites,
+                    self.collision_grid,
                     self.game.player_stats,
+                    self.timers,
+                    self.controls,
                 )
             else:
-                self.spawn_positions.append((obj.x, obj.y))
+                self.spawn_positions.append((x, y))
+
+        self.projectile_system = None
+        if NUMPY_PROJECTILES and np is not None:
+            self.projectile_system = ProjectileSystem()
+
+        self.enemy_system = None
+        if NUMPY_ENEMIES and np is not None:
+            self.enemy_system = EnemySystem(
+                self.player,
+                [sprite.rect for sprite in self.collision_sprites],
+                self.flow_field,
+                self.clock,
+            )
+
+    def build_flow_field(self, map):
+        # paths wide enough for the biggest enemy hitbox (see Enemy.reset),
+        # give or take a little so gaps it only just fits through aren't lost
+        # to the grid resolution; collision slides enemies the rest of the way
+        hitboxes = [
+            frames[0].get_frect().inflate(-20, -40)
+            for frames in self.enemy_frames.values()
+        ]
+        agent_size = (
+            max(hitbox.width for hitbox in hitboxes) * 0.9,
+            max(hitbox.height for hitbox in hitboxes) * 0.9,
+        )
+        return FlowField(
+            map.width,
+            map.height,
+            [sprite.rect for sprite in self.collision_sprites],
+            agent_size,
+        )
 
     def gun_shoot(self):
         if self.can_shoot:
@@ -109,95 +232,227 @@ class GameView(State):
                 (0, -1),
                 (1, -1),
             ]
-            for dx, dy in directions:
-                dir = pygame.Vector2(dx, dy).normalize()
-                Bullet(
+            directions = [pygame.Vector2(dx, dy).normalize() for dx, dy in directions]
+            if self.projectile_system:
+                self.projectile_system.fire(
                     self.bullet_surf,
+                    self.bullet_mask,
                     self.player.rect.center,
-                    dir,
+                    directions,
                     (self.all_sprites, self.bullet_sprites),
+                    self.gun_pierce,
                 )
+            else:
+                for dir in directions:
+                    self.bullet_pool.acquire(
+                        self.bullet_surf,
+                        self.bullet_mask,
+                        self.player.rect.center,
+                        dir,
+                        (self.all_sprites, self.bullet_sprites),
+                        self.timers,
+                        self.gun_pierce,
+                    )
 
             self.can_shoot = False
-            self.shoot_time = pygame.time.get_ticks()
-        else:
-            current_time = pygame.time.get_ticks()
-            if current_time - self.shoot_time >= self.gun_cooldown:
-                self.can_shoot = True
+            self.timers.schedule(self.gun_cooldown, self.reload)
+
+    def reload(self):
+        self.can_shoot = True
+
+    def sprite_pools(self):
+        # every pool recycling this view's sprites, by profiler name
+        pools = {"bullet_pool": self.bullet_pool, "enemy_pool": self.enemy_pool}
+        if self.enemy_system:
+            pools["enemy_proxy_pool"] = self.enemy_system.proxy_pool
+        if self.projectile_system:
+            pools["projectile_proxy_pool"] = self.projectile_system.proxy_pool
+        return pools
+
+    def update_enemy_grid(self):
+        # broad phase: bucket enemies once per tick so bullets and the player
+        # only mask-test the enemies in the cells they overlap
+        self.enemy_grid.clear()
+        for enemy in self.enemy_sprites:
+            self.enemy_grid.insert(enemy, enemy.rect)
+
+    def collide_enemies(self, sprite):
+        return [
+            enemy
+            for enemy in self.enemy_grid.query(sprite.rect)
+            if pygame.sprite.collide_mask(sprite, enemy)
+        ]
 
     def bullet_collision(self):
         if self.bullet_sprites:
             for bullet in self.bullet_sprites:
-                collision_sprites = pygame.sprite.spritecollide(
-                    bullet, self.enemy_sprites, False, pygame.sprite.collide_mask
-                )
+                collision_sprites = [
+                    sprite
+                    for sprite in self.collide_enemies(bullet)
+                    if sprite not in bullet.pierced
+                ]
                 if collision_sprites:
                     self.impact_sound.play()
                     for sprite in collision_sprites:
                         sprite.destroy()
                         self.game.points += sprite.xp_value
-                    bullet.kill()
+                    if bullet.pierce:
+                        bullet.pierce -= 1
+                        bullet.pierced.update(collision_sprites)
+                    else:
+                        bullet.kill()
+
+    def projectile_collision(self, dt):
+        # moves the bullets too, hits are found along their whole step; only
+        # the bullets around the screen get their sprite moved
+        self.lod_rect.center = self.player.rect.center
+        hits = self.projectile_system.update(dt, self.enemy_grid, self.lod_rect)
+        if hits:
+            self.impact_sound.play()
+            for sprite in hits:
+                sprite.destroy()
+                self.game.points += sprite.xp_value
 
     def player_collision(self):
-        if pygame.sprite.spritecollide(
-            self.player, self.enemy_sprites, False, pygame.sprite.collide_mask
-        ):
+        if self.collide_enemies(self.player):
             if self.player.vulnerable:
                 self.player.hp -= 10
-                self.player.vulnerable = False
-                self.player.hurt_time = pygame.time.get_ticks()
+                self.player.hurt()
                 self.impact_sound.play()
 
             if self.player.hp <= 0:
                 self.game.change_state("death")
 
-    def wave_manager(self):
-        # Check if all waves are done
-        if self.current_wave_index >= len(self.level_data.waves):
-            # Check if all enemies are dead
-            if not self.enemy_sprites:
-                self.game.change_state("shop")
-            return
-
-        current_wave = self.level_data.waves[self.current_wave_index]
-        current_time = pygame.time.get_ticks()
-
-        # Check wave duration
-        if current_time - self.wave_start_time >= current_wave.duration * 1000:
-            self.current_wave_index += 1
-            self.wave_start_time = pygame.time.get_ticks()
-            if self.current_wave_index < len(self.level_data.waves):
-                print(f"Starting Wave {self.current_wave_index + 1}")
-            return
+    def load_level(self, level):
+        self.level_data = level
+        self.timeline = SpawnTimeline(level, SPAWN_BUDGET)
 
-        # Spawn enemies
-        if current_time - self.last_spawn_time >= current_wave.spawn_interval:
-            self.last_spawn_time = current_time
-            for _ in range(current_wave.spawn_amount):
-                Enemy(
-                    choice(self.spawn_positions),
-                    self.enemy_frames[current_wave.enemy_type],
-                    (self.all_sprites, self.enemy_sprites),
-                    self.player,
-                    self.collision_sprites,
-                )
+    def wave_manager(self):
+        timeline = self.timeline
+        wave_index = timeline.wave_index
+        for enemy_type in timeline.due(self.clock.get_ticks()):
+            self.spawn_enemy(enemy_type, self.rng.choice(self.spawn_positions))
+        if timeline.wave_index != wave_index and not timeline.finished:
+            print(f"Starting Wave {timeline.wave_index + 1}")
+
+        # Check if all waves are done and all enemies are dead
+        if timeline.finished and not self.enemy_sprites:
+            self.game.change_state("shop")
+
+    def spawn_enemy(self, enemy_type, pos):
+        # a little jitter, so enemies dropped on the same spawn point have an
+        # offset to separate along
+        pos = (pos[0] + self.rng.uniform(-4, 4), pos[1] + self.rng.uniform(-4, 4))
+        groups = (self.all_sprites, self.enemy_sprites)
+        frames = self.enemy_frames[enemy_type]
+        masks = self.enemy_masks[enemy_type]
+        death_surf = self.enemy_death_surfs[enemy_type]
+        if self.enemy_system:
+            return self.enemy_system.spawn(pos, frames, masks, death_surf, groups)
+        enemy = self.enemy_pool.acquire(
+            pos,
+            frames,
+            masks,
+            death_surf,
+            groups,
+            self.player,
+            self.collision_grid,
+            self.enemy_grid,
+            self.flow_field,
+            self.timers,
+        )
+        enemy.lod_slot = self.enemies_spawned % LOD_INTERVAL
+        enemy.spawn_order = self.enemies_spawned
+        self.enemies_spawned += 1
+        return enemy
+
+    def update_enemies(self, dt):
+        # enemies near the screen get the full update every tick, the others
+        # take turns in LOD_INTERVAL groups and catch up on the time they
+        # skipped with the cheaper update_far
+        lod_rect = self.lod_rect
+        lod_rect.center = self.player.rect.center
+        self.lod_tick = lod_tick = (self.lod_tick + 1) % LOD_INTERVAL
+        far = 0
+        for enemy in self.enemy_sprites.sprites():
+            enemy.lod_dt += dt
+            if lod_rect.colliderect(enemy.rect):
+                enemy.update(enemy.lod_dt)
+                enemy.lod_dt = 0
+            else:
+                far += 1
+                if enemy.lod_slot == lod_tick:
+                    enemy.update_far(enemy.lod_dt)
+                    enemy.lod_dt = 0
+        profiler.count("far_enemies", far)
 
     def handle_event(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
                 self.game.change_state("main_menu")
 
+    def exit(self):
+        if isinstance(self.controls, RecordingInput):
+            self.controls.save(
+                self.game.record_path, append=self.game.recorded_levels > 0
+            )
+            self.game.recorded_levels += 1
+
     def update(self, dt):
-        self.gun_shoot()
-        self.all_sprites.update(dt)
-        self.bullet_collision()
-        self.player_collision()
-        self.wave_manager()
+        dt = self.controls.tick(dt)
+        if dt is None:
+            # the replay ran out: on to its next level, or stop after the last
+            if self.controls.next_level():
+                self.game.change_state("game")
+            else:
+                self.game.running = False
+            return
+        self.clock.tick(dt)
+        with profiler.section("timers"):
+            self.timers.advance(self.clock.get_ticks())
+        with profiler.section("flow_field"):
+            self.flow_field.update(self.player.hitbox_rect.center)
+        with profiler.section("gun_shoot"):
+            self.gun_shoot()
+        with profiler.section("player_bullets.update"):
+            self.player.update(dt)
+            if not self.projectile_system:
+                self.bullet_sprites.update(dt)
+        if self.enemy_system:
+            with profiler.section("enemy_system.update"):
+                self.enemy_system.update(dt)
+        else:
+            with profiler.section("enemies.update"):
+                self.update_enemies(dt)
+        with profiler.section("enemy_grid"):
+            self.update_enemy_grid()
+        if self.projectile_system:
+            with profiler.section("projectile_system.update"):
+                self.projectile_collision(dt)
+        else:
+            with profiler.section("bullet_collision"):
+                self.bullet_collision()
+        with profiler.section("player_collision"):
+            self.player_collision()
+        with profiler.section("wave_manager"):
+            self.wave_manager()
+
+        profiler.count("sprites", len(self.all_sprites))
+        profiler.count("enemies", len(self.enemy_sprites))
+        profiler.count("bullets", len(self.bullet_sprites))
+        if profiler.enabled:
+            for name, pool in self.sprite_pools().items():
+                for field, value in pool.stats().items():
+                    profiler.count(f"{name}.{field}", value)
 
     def draw(self, surface):
         surface.fill("black")
-        self.all_sprites.draw(self.player.rect.center)
+        with profiler.section("all_sprites.draw"):
+            self.all_sprites.draw(self.player.rect.center)
+        with profiler.section("hud"):
+            self.draw_hud(surface)
 
+    def draw_hud(self, surface):
         # Health Bar
         health_bar_width = 200
         health_bar_height = 20
@@ -212,20 +467,19 @@ class GameView(State):
         pygame.draw.rect(surface, "green", fill_rect)
 
         # Draw Wave Info
-        font = pygame.font.Font(None, 30)
-
         # Calculate time remaining in current wave
-        if self.current_wave_index < len(self.level_data.waves):
-            current_wave = self.level_data.waves[self.current_wave_index]
-            time_elapsed_ms = pygame.time.get_ticks() - self.wave_start_time
+        timeline = self.timeline
+        if not timeline.finished:
+            current_wave = self.level_data.waves[timeline.wave_index]
+            time_elapsed_ms = self.clock.get_ticks() - timeline.wave_start_time
             time_remaining_s = max(0, current_wave.duration - time_elapsed_ms // 1000)
-            wave_text = f"Wave {self.current_wave_index + 1}/{len(self.level_data.waves)} - Time: {time_remaining_s}"
+            wave_text = f"Wave {timeline.wave_index + 1}/{len(self.level_data.waves)} - Time: {time_remaining_s}"
         else:
             wave_text = "Wave Complete - Clear Enemies!"
 
-        text_surf = font.render(wave_text, True, "white")
+        text_surf = self.wave_label.render(wave_text)
         surface.blit(text_surf, (WINDOW_WIDTH // 2 - text_surf.get_width() // 2, 50))
 
         # Draw Points
-        points_text = font.render(f"Points: {self.game.points}", True, "gold")
+        points_text = self.points_label.render(f"Points: {self.game.points}")
         surface.blit(points_text, (10, 40))
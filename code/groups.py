@@ -1,18 +1,104 @@
 from settings import *
+from math import floor
+from bisect import insort
+from heapq import merge
+
+def depth_key(sprite):
+    return sprite.rect.centery
+
+
+class GroundChunks:
+    # bakes a static tile layer into chunk surfaces once, so a frame only blits
+    # the handful of chunks that intersect the camera
+    def __init__(self, tiles, chunk_tiles = 8):
+        self.chunk_size = TILE_SIZE * chunk_tiles
+        self.chunks = {}
+
+        chunk_tiles_map = {}
+        for x, y, image in tiles:
+            key = (x // chunk_tiles, y // chunk_tiles)
+            pos = ((x % chunk_tiles) * TILE_SIZE, (y % chunk_tiles) * TILE_SIZE)
+            chunk_tiles_map.setdefault(key, []).append((image, pos))
+
+        for key, blit_sequence in chunk_tiles_map.items():
+            # the screen is cleared to black before drawing, so an opaque chunk
+            # filled black looks the same as the loose tiles and blits faster
+            surf = pygame.Surface((self.chunk_size, self.chunk_size)).convert()
+            surf.fill('black')
+            surf.blits(blit_sequence, doreturn = False)
+            self.chunks[key] = surf
+
+    def draw(self, surface, offset):
+        left = int(-offset.x // self.chunk_size)
+        top = int(-offset.y // self.chunk_size)
+        right = int((-offset.x + WINDOW_WIDTH) // self.chunk_size)
+        bottom = int((-offset.y + WINDOW_HEIGHT) // self.chunk_size)
+
+        blit_sequence = []
+        for chunk_y in range(top, bottom + 1):
+            for chunk_x in range(left, right + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if chunk:
+                    # floor keeps chunk seams on the same pixels the per-tile blits used
+                    pos = (floor(chunk_x * self.chunk_size + offset.x), floor(chunk_y * self.chunk_size + offset.y))
+                    blit_sequence.append((chunk, pos))
+        surface.blits(blit_sequence, doreturn = False)
+
 
 class AllSprites(pygame.sprite.Group):
     def __init__(self):
         super().__init__()
         self.display_surface = pygame.display.get_surface()
         self.offset = pygame.Vector2()
+        self.camera_rect = pygame.FRect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.ground = None
+
+        # static sprites never move, so they stay bucketed by row and sorted
+        # inside each row; moving sprites are culled and sorted per frame
+        self.static_rows = {}
+        self.static_margin = 0
+        self.dynamic_sprites = {}
+
+    def add_internal(self, sprite, layer = None):
+        super().add_internal(sprite, layer)
+        if hasattr(sprite, 'static'):
+            row = int(sprite.rect.centery // TILE_SIZE)
+            insort(self.static_rows.setdefault(row, []), sprite, key = depth_key)
+            self.static_margin = max(self.static_margin, sprite.rect.height / 2)
+        else:
+            self.dynamic_sprites[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        if hasattr(sprite, 'static'):
+            self.static_rows[int(sprite.rect.centery // TILE_SIZE)].remove(sprite)
+        else:
+            del self.dynamic_sprites[sprite]
+
+    def visible_static(self):
+        camera_rect = self.camera_rect
+        first_row = int((camera_rect.top - self.static_margin) // TILE_SIZE)
+        last_row = int((camera_rect.bottom + self.static_margin) // TILE_SIZE)
+        for row in range(first_row, last_row + 1):
+            for sprite in self.static_rows.get(row, ()):
+                if camera_rect.colliderect(sprite.rect):
+                    yield sprite
 
     def draw(self, target_pos):
         self.offset.x = -(target_pos[0] - WINDOW_WIDTH / 2)
         self.offset.y = -(target_pos[1] - WINDOW_HEIGHT / 2)
+        self.camera_rect.topleft = (-self.offset.x, -self.offset.y)
+
+        if self.ground:
+            self.ground.draw(self.display_surface, self.offset)
 
-        ground_sprites = [sprite for sprite in self if hasattr(sprite, 'ground')]
-        object_sprites = [sprite for sprite in self if not hasattr(sprite, 'ground')]
+        camera_rect = self.camera_rect
+        visible_dynamic = [sprite for sprite in self.dynamic_sprites if camera_rect.colliderect(sprite.rect)]
+        visible_dynamic.sort(key = depth_key)
 
-        for layer in [ground_sprites, object_sprites]:
-            for sprite in sorted(layer, key = lambda sprite: sprite.rect.centery):
-                self.display_surface.blit(sprite.image, sprite.rect.topleft + self.offset)
\ No newline at end of file
+        # one blits() call per layer, positions as plain tuples
+        offset_x, offset_y = self.offset
+        self.display_surface.blits(
+            [(sprite.image, (sprite.rect.x + offset_x, sprite.rect.y + offset_y))
+             for sprite in merge(self.visible_static(), visible_dynamic, key = depth_key)],
+            doreturn = False)
\ No newline at end of file
@@ -1,25 +1,47 @@
+import startup
 from settings import WINDOW_WIDTH, WINDOW_HEIGHT
 import pygame
 import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from importlib import import_module
 from os.path import join
 
 
-from views import MainMenuView, SettingsView, SkillTreeView, DeathView
-from game_view import GameView
+from views import MenuView, MainMenuView, SettingsView, SkillTreeView, DeathView
+from profiler import profiler
+from replay import ReplayInput
+from assets import assets
+from atlas import load_atlas
+
+# most fixed updates run per rendered frame before dropping time
+MAX_STEPS_PER_FRAME = 5
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, fixed_dt=None):
+        # headless runs use SDL's dummy drivers, so no display or sound card is needed
+        self.headless = headless
+        self.fixed_dt = fixed_dt
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+
         # setup
         pygame.init()
         self.display_surface = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("Survivor")
+        assets.use_atlas(load_atlas())
         self.clock = pygame.time.Clock()
         self.running = True
 
         # Settings
         self.music_volume = 0.5
         self.sfx_volume = 0.1
+        self.max_fps = 0  # 0 = uncapped
+        self.idle_fps = 30  # frame cap while a menu is shown
         self.load_settings()
 
         # Player Data Persistence
@@ -31,17 +53,23 @@ class Game:
         }
         self.current_level_index = 0
 
-        # States
-        self.states = {
-            "main_menu": MainMenuView(self),
-            "settings": SettingsView(self),
-            "skill_tree": SkillTreeView(self),
-            "death": DeathView(self),
-            "game": None,
-            "shop": None,  # Shop created on demand
+        # Input recording / replay (see replay.py)
+        self.seed = None
+        self.record_path = None
+        self.recorded_levels = 0
+        self.replay = None
+
+        # States, each built the first time it is shown and then kept; the
+        # game and the shop are built new every time (see change_state)
+        self.state_classes = {
+            "main_menu": MainMenuView,
+            "settings": SettingsView,
+            "skill_tree": SkillTreeView,
+            "death": DeathView,
         }
+        self.states = {}
 
-        self.state = self.states["main_menu"]
+        self.state = self.get_state("main_menu")
 
     def load_settings(self):
         try:
@@ -49,16 +77,52 @@ class Game:
                 data = json.load(f)
                 self.music_volume = data.get("music_volume", 0.5)
                 self.sfx_volume = data.get("sfx_volume", 0.1)
+                self.max_fps = data.get("max_fps", 0)
+                self.idle_fps = data.get("idle_fps", 30)
         except (FileNotFoundError, json.JSONDecodeError):
             pass
 
     def save_settings(self):
-        data = {"music_volume": self.music_volume, "sfx_volume": self.sfx_volume}
+        data = {
+            "music_volume": self.music_volume,
+            "sfx_volume": self.sfx_volume,
+            "max_fps": self.max_fps,
+            "idle_fps": self.idle_fps,
+        }
         with open(join("data", "settings.json"), "w") as f:
             json.dump(data, f)
 
+    def get_state(self, state_name):
+        if state_name not in self.states:
+            self.states[state_name] = self.state_classes[state_name](self)
+        return self.states[state_name]
+
+    def preload_level(self):
+        # decode what the next GameView loads while a menu is up; until the
+        # first game, game_view itself (and numpy with it) is imported on the
+        # preload thread too. While that import runs, game_view already sits
+        # half built in sys.modules; the thread busy with it is left alone
+        preload = getattr(sys.modules.get("game_view"), "PRELOAD", None)
+        if preload is not None:
+            assets.preload(preload)
+        elif not (assets.preload_thread and assets.preload_thread.is_alive()):
+            assets.preload(lambda: import_module("game_view").PRELOAD)
+
     def change_state(self, state_name):
+        self.state.exit()
+        if (
+            state_name != "game"
+            and self.replay
+            and self.replay.finished
+            and self.replay.next_level()
+        ):
+            # a replayed level ended: the recording goes straight on to the
+            # next one, whose header holds what was picked in the shop
+            state_name = "game"
         if state_name == "game":
+            # the whole simulation, imported when the first game starts
+            from game_view import GameView
+
             self.state = GameView(self)
         elif state_name == "shop":
             from views import (
@@ -66,31 +130,180 @@ class Game:
             )  # Avoid circular import if possible, or move imports
 
             self.state = ShopView(self)
-        elif state_name in self.states:
-            self.state = self.states[state_name]
+        elif state_name in self.state_classes:
+            self.state = self.get_state(state_name)
+        self.state.enter()
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+                self.state.enter()
+            if event.type == pygame.WINDOWEXPOSED:
+                self.state.enter()
+            if hasattr(self.state, "handle_event"):
+                self.state.handle_event(event)
+                # any key press may change what a menu shows
+                if event.type == pygame.KEYDOWN and isinstance(self.state, MenuView):
+                    self.state.dirty = True
 
     def run(self):
+        accumulator = 0
+        self.state.enter()
+        # the first frame goes out right away instead of waiting on the cap
+        self.clock.tick()
+        frame_cap = 0
         while self.running:
-            # dt
-            dt = self.clock.tick() / 1000
+            dt = self.clock.tick(frame_cap) / 1000
 
             # event loop
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                if hasattr(self.state, "handle_event"):
-                    self.state.handle_event(event)
+            with profiler.section("events"):
+                self.handle_events()
 
             # update
-            self.state.update(dt)
+            with profiler.section("update"):
+                if self.fixed_dt:
+                    # fixed timestep, capped so a long stall does not spiral
+                    accumulator = min(
+                        accumulator + dt, self.fixed_dt * MAX_STEPS_PER_FRAME
+                    )
+                    while accumulator >= self.fixed_dt:
+                        self.state.update(self.fixed_dt)
+                        accumulator -= self.fixed_dt
+                else:
+                    self.state.update(dt)
 
             # draw
-            self.state.draw(self.display_surface)
-            pygame.display.update()
+            with profiler.section("draw"):
+                dirty_rects = self.state.draw(self.display_surface)
+            if profiler.overlay:
+                profiler.draw(self.display_surface)
+                dirty_rects = None
+            with profiler.section("display"):
+                if dirty_rects is None:
+                    pygame.display.update()
+                elif dirty_rects:
+                    pygame.display.update(dirty_rects)
+            profiler.end_frame()
+
+            if startup.report:
+                startup.report.mark("first frame")
+                startup.report.print()
+                startup.report = None
 
+            # menus are throttled to idle_fps
+            frame_cap = self.idle_fps if self.state.idle else self.max_fps
+
+        self.state.exit()
+        profiler.close_log()
         pygame.quit()
 
+    def run_headless(self, ticks, render=False):
+        # step the simulation as fast as possible with a fixed dt and report
+        # simulation throughput separately from drawing
+        self.change_state("game")
+        game_view = self.state
+        sim_ticks = 0
+        update_time = draw_time = 0
+        tick = 0
+        while self.running and tick < ticks and self.state is game_view:
+            self.handle_events()
+
+            start = time.perf_counter()
+            self.state.update(self.fixed_dt)
+            update_time += time.perf_counter() - start
+            tick += 1
+            if self.state is not game_view and type(self.state) is type(game_view):
+                # a replay moved on to its next level
+                sim_ticks += game_view.clock.get_ticks()
+                game_view = self.state
+
+            if render:
+                start = time.perf_counter()
+                self.state.draw(self.display_surface)
+                draw_time += time.perf_counter() - start
+            profiler.end_frame()
+
+        self.state.exit()
+        profiler.close_log()
+        pygame.quit()
+        return {
+            "ticks": tick,
+            "sim_seconds": (sim_ticks + game_view.clock.get_ticks()) / 1000,
+            "update_seconds": update_time,
+            "draw_seconds": draw_time,
+            "ticks_per_second": tick / update_time if update_time else 0,
+            "enemies": len(game_view.enemy_sprites),
+            "ended_in": type(self.state).__name__,
+        }
+
+
+def parse_args():
+    parser = ArgumentParser(description="Vampire Survivors clone")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="run the game simulation without a display and print throughput",
+    )
+    parser.add_argument(
+        "--ticks",
+        type=int,
+        help="simulation ticks for --headless (default 3600, or the whole --replay)",
+    )
+    parser.add_argument(
+        "--tick-rate",
+        type=int,
+        default=None,
+        help="fixed simulation ticks per second (default: variable dt, 60 when headless)",
+    )
+    parser.add_argument(
+        "--render", action="store_true", help="also draw frames in --headless"
+    )
+    parser.add_argument("--level", type=int, default=0, help="level index to start")
+    parser.add_argument("--seed", type=int, help="seed for enemy spawns")
+    parser.add_argument(
+        "--record",
+        help="record input and seed of every level of the game session here",
+    )
+    parser.add_argument("--replay", help="play back a recording made with --record")
+    parser.add_argument(
+        "--profile-log",
+        help="stream per frame profiler data to this .csv or .jsonl file (F3 shows the overlay)",
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="print import times and the time to the first frame",
+    )
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    if startup.report:
+        startup.report.mark("imports")
+    args = parse_args()
+    tick_rate = args.tick_rate or (60 if args.headless else None)
+    game = Game(headless=args.headless, fixed_dt=tick_rate and 1 / tick_rate)
+    if startup.report:
+        startup.report.mark("Game()")
+    game.current_level_index = args.level
+    game.seed = args.seed
+    game.record_path = args.record
+    if args.replay:
+        game.replay = ReplayInput(args.replay)
+        if not args.headless:
+            game.change_state("game")
+    if args.profile_log:
+        profiler.open_log(args.profile_log)
+    if args.headless:
+        # no frames are shown, so the report ends at Game()
+        if startup.report:
+            startup.report.print()
+            startup.report = None
+        ticks = args.ticks or (float("inf") if args.replay else 3600)
+        for key, value in game.run_headless(ticks, args.render).items():
+            print(f"{key}: {value}")
+    else:
+        game.run()
@@ -0,0 +1,143 @@
+import os
+from array import array
+from os.path import basename, dirname, join, normpath
+
+import pygame
+
+from assets import assets
+
+CACHE_DIR = join("data", "cache")
+CACHE_VERSION = 1
+
+
+def map_sources(tmx_path):
+    # the TMX file plus every external tileset it references
+    from xml.etree import ElementTree
+
+    sources = [tmx_path]
+    for tileset in ElementTree.parse(tmx_path).getroot().iter("tileset"):
+        if "source" in tileset.attrib:
+            sources.append(normpath(join(dirname(tmx_path), tileset.attrib["source"])))
+    return sources
+
+
+def source_stamps(sources):
+    stamps = {}
+    for path in sources:
+        stat = os.stat(path)
+        stamps[path] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+def compile_map(tmx_path):
+    # parse the TMX once with pytmx (without loading any images) and keep only
+    # what GameView.setup needs, as flat arrays and tuples
+    from pytmx import TiledMap
+
+    tmx = TiledMap(tmx_path)
+
+    # gid -> (image path, source rect or None, (flip h, flip v, flip diagonal))
+    images = {}
+    for gid, image in enumerate(tmx.images):
+        if image:
+            path, rect, flags = image
+            flags = tuple(flags) if flags else (0, 0, 0)
+            images[gid] = (normpath(path), tuple(rect) if rect else None, flags)
+
+    ground_layer = tmx.get_layer_by_name("Ground")
+    ground = array("H", [0]) * (tmx.width * tmx.height)
+    for x, y, gid in ground_layer.iter_data():
+        ground[y * tmx.width + x] = gid
+
+    return {
+        "version": CACHE_VERSION,
+        "sources": source_stamps(map_sources(tmx_path)),
+        "width": tmx.width,
+        "height": tmx.height,
+        "images": images,
+        "ground": ground,
+        "objects": [
+            (obj.x, obj.y, obj.gid) for obj in tmx.get_layer_by_name("Objects")
+        ],
+        "collisions": [
+            (obj.x, obj.y, obj.width, obj.height)
+            for obj in tmx.get_layer_by_name("Collisions")
+        ],
+        "entities": [
+            (obj.name, obj.x, obj.y) for obj in tmx.get_layer_by_name("Entities")
+        ],
+    }
+
+
+def cache_path(tmx_path):
+    return join(CACHE_DIR, basename(tmx_path) + ".cache")
+
+
+def load_compiled(tmx_path):
+    # the cached data if it is still fresh, otherwise compile and store it;
+    # pickle, like pytmx, is only needed once a map is loaded
+    import pickle
+
+    path = cache_path(tmx_path)
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data["version"] == CACHE_VERSION and data["sources"] == source_stamps(
+            data["sources"]
+        ):
+            return data
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+        pass
+
+    data = compile_map(tmx_path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return data
+
+
+class CompiledMap:
+    # the map as GameView.setup reads it, with tile surfaces cut from the
+    # shared tileset images on first use
+    def __init__(self, data):
+        self.data = data
+        self.width = data["width"]
+        self.height = data["height"]
+        self.surfaces = {}
+
+    def image(self, gid):
+        surf = self.surfaces.get(gid)
+        if surf is None:
+            path, rect, (flip_h, flip_v, flip_diagonal) = self.data["images"][gid]
+            surf = assets.image(path)
+            if rect:
+                surf = surf.subsurface(rect)
+            if flip_diagonal:
+                surf = pygame.transform.flip(
+                    pygame.transform.rotate(surf, 270), True, False
+                )
+            if flip_h or flip_v:
+                surf = pygame.transform.flip(surf, flip_h, flip_v)
+            self.surfaces[gid] = surf
+        return surf
+
+    def ground_tiles(self):
+        width = self.width
+        for index, gid in enumerate(self.data["ground"]):
+            if gid:
+                yield index % width, index // width, self.image(gid)
+
+    def objects(self):
+        for x, y, gid in self.data["objects"]:
+            yield x, y, self.image(gid)
+
+    def collisions(self):
+        return self.data["collisions"]
+
+    def entities(self):
+        return self.data["entities"]
+
+
+def load_map(tmx_path, data=None):
+    # data: what load_compiled returned for it, if that already ran
+    return CompiledMap(data or load_compiled(tmx_path))
@@ -1,80 +1,27 @@
-from os.path import join
-from os import walk
 import pygame
 
+from assets import assets
+
+# one animation folder per facing, loaded by Player and preloaded by GameView
+PLAYER_FRAME_PATHS = {
+    state: ("images", "player", state) for state in ("left", "right", "up", "down")
+}
+
 
 class Player(pygame.sprite.Sprite):
-    def __init__(self, pos, groups, collision_sprites, stats):
+    def __init__(self, pos, groups, collision_grid, stats, timers, controls):
         super().__init__(groups)
         self.max_hp = stats["max_hp"]
         self.hp = stats["max_hp"]
         self.speed = stats["speed"]
         self.damage = stats["damage"]
 
-        self.frames = {
-            "left": [
-                pygame.image.load(
-                    join("images", "player", "left", "0.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "left", "1.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "left", "2.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "left", "3.png")
-                ).convert_alpha(),
-            ],
-            "right": [
-                pygame.image.load(
-                    join("images", "player", "right", "0.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "right", "1.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "right", "2.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "right", "3.png")
-                ).convert_alpha(),
-            ],
-            "up": [
-                pygame.image.load(
-                    join("images", "player", "up", "0.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "up", "1.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "up", "2.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "up", "3.png")
-                ).convert_alpha(),
-            ],
-            "down": [
-                pygame.image.load(
-                    join("images", "player", "down", "0.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "down", "1.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "down", "2.png")
-                ).convert_alpha(),
-                pygame.image.load(
-                    join("images", "player", "down", "3.png")
-                ).convert_alpha(),
-            ],
-        }
-
-        # self.load_images()
+        self.load_images()
 
         self.state = "down"
         self.frame_index = 0
         self.image = self.frames[self.state][self.frame_index]
+        self.mask = self.masks[self.state][self.frame_index]
 
         self.rect = self.image.get_frect(center=pos)
         self.hitbox_rect = self.rect.inflate(-60, -90)
@@ -82,30 +29,33 @@ class Player(pygame.sprite.Sprite):
         # movement
         self.direction = pygame.Vector2()
         self.speed = 500
-        self.collision_sprites = collision_sprites
+        self.collision_grid = collision_grid
+        self.timers = timers
+        self.controls = controls
 
         # damage timer
         self.vulnerable = True
-        self.hurt_time = 0
         self.invulnerability_duration = 500
 
+    def hurt(self):
+        # invulnerable until the timer runs out
+        self.vulnerable = False
+        self.timers.schedule(self.invulnerability_duration, self.recover)
+
+    def recover(self):
+        self.vulnerable = True
+
     def load_images(self):
-        self.frames = {"left": [], "right": [], "up": [], "down": []}
-
-        for state in self.frames.keys():
-            for folder_path, sub_folders, file_names in walk(
-                join("images", "player", state)
-            ):
-                if file_names:
-                    for file_name in sorted(
-                        file_names, key=lambda name: int(name.split(".")[0])
-                    ):
-                        full_path = join(folder_path, file_name)
-                        surf = pygame.image.load(full_path).convert_alpha()
-                        self.frames[state].append(surf)
+        # frames and masks are shared through the asset cache, so a new Player
+        # per level does not decode the PNGs again
+        self.frames = {}
+        self.masks = {}
+        for state, path in PLAYER_FRAME_PATHS.items():
+            self.frames[state] = assets.frames(*path)
+            self.masks[state] = assets.masks(*path)
 
     def move(self, dt):
-        keys = pygame.key.get_pressed()
+        keys = self.controls.get_pressed()
 
         # 좌우 움직임 처리
         move_right = keys[pygame.K_d]
@@ -130,7 +80,7 @@ class Player(pygame.sprite.Sprite):
         self.rect.center = self.hitbox_rect.center
 
     def collision(self, direction):
-        for sprite in self.collision_sprites:
+        for sprite in self.collision_grid.query(self.hitbox_rect):
             if sprite.rect.colliderect(self.hitbox_rect):
                 if direction == "horizontal":
                     if self.direction.x > 0:
@@ -161,16 +111,10 @@ class Player(pygame.sprite.Sprite):
         else:
             self.frame_index = 0
 
-        self.image = self.frames[self.state][
-            int(self.frame_index) % len(self.frames[self.state])
-        ]
+        index = int(self.frame_index) % len(self.frames[self.state])
+        self.image = self.frames[self.state][index]
+        self.mask = self.masks[self.state][index]
 
     def update(self, dt):
         self.move(dt)
         self.animate(dt)
-
-        # cooldown
-        if not self.vulnerable:
-            current_time = pygame.time.get_ticks()
-            if current_time - self.hurt_time >= self.invulnerability_duration:
-                self.vulnerable = True
@@ -0,0 +1,30 @@
+class SpritePool:
+    # recycles killed sprites instead of letting them be garbage collected;
+    # pooled classes re-initialise themselves in reset() and hand themselves
+    # back through release() when killed
+    def __init__(self, sprite_class):
+        self.sprite_class = sprite_class
+        self.free = []
+        self.size = 0
+        self.in_use = 0
+        self.high_water = 0
+
+    def acquire(self, *args):
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args)
+        else:
+            sprite = self.sprite_class(*args)
+            sprite.pool = self
+            self.size += 1
+
+        self.in_use += 1
+        self.high_water = max(self.high_water, self.in_use)
+        return sprite
+
+    def release(self, sprite):
+        self.in_use -= 1
+        self.free.append(sprite)
+
+    def stats(self):
+        return {"size": self.size, "in_use": self.in_use, "high_water": self.high_water}
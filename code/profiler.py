@@ -0,0 +1,164 @@
+import csv
+import json
+import sys
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import pygame
+
+from assets import assets
+from text import text_cache
+
+# shared no-op returned by section() while profiling is off
+NULL_SECTION = nullcontext()
+
+
+class Section:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        timings = self.profiler.timings
+        timings[self.name] = (
+            timings.get(self.name, 0) + time.perf_counter() - self.start
+        )
+
+
+class FrameProfiler:
+    # per frame section timings, sprite counts and allocation counts; while
+    # disabled section() hands back a shared no-op, so it can stay in the loop
+    def __init__(self, history=240):
+        self.enabled = False
+        self.overlay = False
+        self.sections = {}
+        self.timings = {}
+        self.counts = {}
+        self.history = deque(maxlen=history)
+        self.frame_start = time.perf_counter()
+        self.allocated_blocks = sys.getallocatedblocks()
+        self.log_file = None
+        self.log_writer = None
+        self.log_fields = []
+
+    def section(self, name):
+        if not self.enabled:
+            return NULL_SECTION
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = Section(self, name)
+        return section
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counts[name] = value
+
+    def toggle(self):
+        self.overlay = not self.overlay
+        self.enabled = self.overlay or self.log_file is not None
+        self.frame_start = time.perf_counter()
+
+    def open_log(self, path):
+        # .csv gets one column per field seen so far, anything else JSONL
+        self.log_file = open(path, "w+", newline="")
+        self.log_writer = None
+        self.log_fields = []
+        self.enabled = True
+
+    def close_log(self):
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
+            self.enabled = self.overlay
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        allocated_blocks = sys.getallocatedblocks()
+        frame = {
+            "frame_ms": (now - self.frame_start) * 1000,
+            **{name: seconds * 1000 for name, seconds in self.timings.items()},
+            **self.counts,
+            "allocated_blocks": allocated_blocks - self.allocated_blocks,
+        }
+        self.history.append(frame)
+        self.frame_start = now
+        self.allocated_blocks = allocated_blocks
+        self.timings = {}
+        self.counts = {}
+
+        if self.log_file:
+            self.write(frame)
+
+    def write(self, frame):
+        if not self.log_file.name.endswith(".csv"):
+            self.log_file.write(json.dumps(frame) + "\n")
+            return
+        new_fields = [name for name in frame if name not in self.log_fields]
+        if new_fields:
+            # a section or counter the header doesn't have yet (the menus log
+            # fewer than GameView): widen the header and write the earlier
+            # rows again under it, with the new columns left empty
+            rows = []
+            if self.log_writer is not None:
+                self.log_file.seek(0)
+                rows = list(csv.DictReader(self.log_file))
+                self.log_file.seek(0)
+                self.log_file.truncate()
+            self.log_fields += new_fields
+            self.log_writer = csv.DictWriter(self.log_file, fieldnames=self.log_fields)
+            self.log_writer.writeheader()
+            self.log_writer.writerows(rows)
+        self.log_writer.writerow(frame)
+
+    def draw(self, surface):
+        if not self.overlay or not self.history:
+            return
+
+        font = assets.font(None, 22)
+        frame = self.history[-1]
+        lines = [
+            f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}"
+            for name, value in frame.items()
+        ]
+
+        width, line_height, graph_height = 260, 18, 60
+        panel = pygame.Rect(
+            surface.get_width() - width - 10,
+            10,
+            width,
+            len(lines) * line_height + graph_height + 20,
+        )
+        pygame.draw.rect(surface, (0, 0, 0), panel)
+        for index, line in enumerate(lines):
+            text_surf = text_cache.render(font, line, "white")
+            surface.blit(
+                text_surf, (panel.left + 8, panel.top + 6 + index * line_height)
+            )
+
+        # rolling frame time graph, 33 ms (30 fps) at the top
+        graph_bottom = panel.bottom - 8
+        bar_width = width / self.history.maxlen
+        for index, past_frame in enumerate(self.history):
+            frame_ms = past_frame["frame_ms"]
+            height = min(graph_height, frame_ms / 33.3 * graph_height)
+            color = (
+                "green" if frame_ms <= 16.7 else "yellow" if frame_ms <= 33.3 else "red"
+            )
+            bar = pygame.Rect(
+                panel.left + index * bar_width,
+                graph_bottom - height,
+                max(1, bar_width),
+                height,
+            )
+            pygame.draw.rect(surface, color, bar)
+
+
+profiler = FrameProfiler()
@@ -0,0 +1,324 @@
+from itertools import chain
+from math import ceil, floor
+
+from settings import *
+from pool import SpritePool
+
+try:
+    import numpy as np
+except ImportError:  # optional, GameView falls back to per-object Bullet sprites
+    np = None
+
+
+class ProjectileProxy(pygame.sprite.Sprite):
+    # drawable stand-in for one ProjectileSystem slot, like EnemyProxy
+    __slots__ = ("system", "index", "mask", "pool")
+
+    def __init__(self, system, index, image, mask, groups):
+        super().__init__()
+        self.pool = None
+        self.reset(system, index, image, mask, groups)
+
+    def reset(self, system, index, image, mask, groups):
+        self.system = system
+        self.index = index
+        self.image = image
+        self.mask = mask
+        self.rect = self.image.get_frect()
+        self.add(groups)
+
+    def kill(self):
+        if self.alive():
+            super().kill()
+            self.system.release(self)
+            if self.pool:
+                self.pool.release(self)
+
+
+class ProjectileSystem:
+    # every projectile is a row in flat arrays (position, velocity, remaining
+    # lifetime, piercing, weapon) and all of them are moved, aged and hit
+    # tested against the enemies in one batch per tick. The hit test sweeps
+    # each projectile's whole step, so fast projectiles can't skip past an
+    # enemy between two ticks.
+    def __init__(self, capacity=256):
+        self.proxy_pool = SpritePool(ProjectileProxy)
+        self.proxies = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+        # enemies a piercing projectile already went through, by slot
+        self.pierced = {}
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        self.capacity = capacity
+        self.pos = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.half_size = np.zeros((capacity, 2))
+        self.lifetime = np.zeros(capacity)
+        self.pierce = np.zeros(capacity, dtype=int)
+        self.weapon = np.zeros(capacity, dtype=int)
+        self.alive = np.zeros(capacity, dtype=bool)
+        # whether the proxy rect was last placed in view, see update
+        self.shown = np.zeros(capacity, dtype=bool)
+
+    def grow(self):
+        old_capacity = self.capacity
+        arrays = (
+            self.pos,
+            self.velocity,
+            self.half_size,
+            self.lifetime,
+            self.pierce,
+            self.weapon,
+            self.alive,
+            self.shown,
+        )
+        self.allocate(old_capacity * 2)
+        for new, old in zip(
+            (
+                self.pos,
+                self.velocity,
+                self.half_size,
+                self.lifetime,
+                self.pierce,
+                self.weapon,
+                self.alive,
+                self.shown,
+            ),
+            arrays,
+        ):
+            new[:old_capacity] = old
+        self.proxies.extend([None] * old_capacity)
+        self.free.extend(range(self.capacity - 1, old_capacity - 1, -1))
+
+    def fire(
+        self,
+        surf,
+        mask,
+        pos,
+        directions,
+        groups,
+        pierce=0,
+        weapon=0,
+        speed=600,
+        lifetime=1000,
+    ):
+        # one projectile per direction, all from pos; speed and lifetime
+        # default to the Bullet sprite's
+        for direction in directions:
+            if not self.free:
+                self.grow()
+            index = self.free.pop()
+
+            proxy = self.proxy_pool.acquire(self, index, surf, mask, groups)
+            proxy.rect.center = pos
+            self.proxies[index] = proxy
+
+            self.pos[index] = pos
+            self.velocity[index] = (direction[0] * speed, direction[1] * speed)
+            self.half_size[index] = (proxy.rect.width / 2, proxy.rect.height / 2)
+            self.lifetime[index] = lifetime
+            self.pierce[index] = pierce
+            self.weapon[index] = weapon
+            self.alive[index] = True
+            self.shown[index] = True
+
+    def release(self, proxy):
+        index = proxy.index
+        if self.proxies[index] is proxy:
+            self.alive[index] = False
+            self.proxies[index] = None
+            self.pierced.pop(index, None)
+            self.free.append(index)
+
+    def broad_phase(self, swept, enemy_grid):
+        # (row, enemy) pairs of swept boxes and the enemies in the grid cells
+        # they cover, without a query per projectile: every (row, cell) pair
+        # is listed with numpy, each occupied cell is read from the grid once,
+        # and the enemies met in several cells are paired with a row once.
+        # Returns the pair rows, the pair enemy ids, each pair's place in the
+        # order a grid query for its row lists them, and the enemies and their
+        # rects by id
+        cell_size = enemy_grid.cell_size
+        low = (swept[:, :2] // cell_size).astype(np.int64)
+        span = (swept[:, 2:] // cell_size).astype(np.int64) - low + 1
+        counts = span[:, 0] * span[:, 1]
+        rows = np.repeat(np.arange(len(swept)), counts)
+        nth = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = low[rows, 0] + nth % span[rows, 0]
+        cell_y = low[rows, 1] + nth // span[rows, 0]
+        _, first, cell_of_pair = np.unique(
+            (cell_x << 32) + cell_y, return_index=True, return_inverse=True
+        )
+
+        cells = enemy_grid.cells
+        ids = {}
+        enemies = []
+        members = []
+        ends = []
+        for key in zip(cell_x[first].tolist(), cell_y[first].tolist()):
+            for enemy in cells.get(key, ()):
+                enemy_id = ids.get(enemy)
+                if enemy_id is None:
+                    enemy_id = ids[enemy] = len(enemies)
+                    enemies.append(enemy)
+                members.append(enemy_id)
+            ends.append(len(members))
+        if not members:
+            return None
+
+        ends = np.array(ends)
+        sizes = np.diff(ends, prepend=0)
+        pair_sizes = sizes[cell_of_pair]
+        pair_rows = np.repeat(rows, pair_sizes)
+        nth = np.arange(len(pair_rows)) - np.repeat(
+            np.cumsum(pair_sizes) - pair_sizes, pair_sizes
+        )
+        members = np.array(members)
+        pair_ids = members[np.repeat((ends - sizes)[cell_of_pair], pair_sizes) + nth]
+        pairs, query_order = np.unique(
+            pair_rows * len(enemies) + pair_ids, return_index=True
+        )
+        rects = np.fromiter(
+            chain.from_iterable(enemy.rect for enemy in enemies),
+            float,
+            4 * len(enemies),
+        ).reshape(-1, 4)
+        return (
+            pairs // len(enemies),
+            pairs % len(enemies),
+            query_order,
+            enemies,
+            rects,
+        )
+
+    def sweep(self, start, step, half_size, rects):
+        # slab test of each (projectile step, enemy rect) pair, the rect grown
+        # by the projectile's half size: the fraction of the step at which
+        # the pair starts overlapping, inf where they don't meet
+        low = rects[:, :2] - half_size
+        high = low + rects[:, 2:] + 2 * half_size
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_low = (low - start) / step
+            t_high = (high - start) / step
+        t_near = np.minimum(t_low, t_high)
+        t_far = np.maximum(t_low, t_high)
+
+        # not moving along an axis: inside the slab for the whole step or never
+        still = step == 0
+        inside = (start >= low) & (start <= high)
+        t_near = np.where(still, np.where(inside, -np.inf, np.inf), t_near)
+        t_far = np.where(still, np.where(inside, np.inf, -np.inf), t_far)
+
+        enter = np.maximum(t_near.max(axis=1), 0)
+        leave = np.minimum(t_far.min(axis=1), 1)
+        return np.where(enter <= leave, enter, np.inf), leave
+
+    def narrow_phase(self, mask, half_size, enemy, start, step, enter, leave):
+        # mask test at points along the part of the step inside the enemy
+        # rect, spaced by the projectile's size so no opaque pixel is skipped
+        half_width, half_height = half_size
+        length = max(abs(step[0]), abs(step[1]))
+        samples = ceil((leave - enter) * length / min(half_width, half_height)) + 1
+        for sample in range(samples):
+            t = enter + (leave - enter) * sample / max(1, samples - 1)
+            offset = (
+                floor(start[0] + step[0] * t - half_width - enemy.rect.left),
+                floor(start[1] + step[1] * t - half_height - enemy.rect.top),
+            )
+            if enemy.mask.overlap(mask, offset):
+                return True
+        return False
+
+    def update(self, dt, enemy_grid, view):
+        # returns the enemies hit this tick, in the order they were hit. Only
+        # the proxies in view (or just leaving it) have their rects moved, the
+        # rest are drawn nowhere and are only touched again when they die
+        moving = np.flatnonzero(self.alive)
+        if not len(moving):
+            return []
+        start = self.pos[moving]
+        step = self.velocity[moving] * dt
+        half_size = self.half_size[moving]
+        end = start + step
+        self.pos[moving] = end
+        self.lifetime[moving] -= dt * 1000
+
+        # broad phase: the enemies in the grid cells each swept step covers
+        swept = np.hstack(
+            (np.minimum(start, end) - half_size, np.maximum(start, end) + half_size)
+        )
+        candidates = self.broad_phase(swept, enemy_grid)
+
+        hits = []
+        stopped = set()
+        if candidates:
+            rows, ids, query_order, enemies, rects = candidates
+            enter, leave = self.sweep(
+                start[rows], step[rows], half_size[rows], rects[ids]
+            )
+            # by projectile, then by how early in the step they met, ties in
+            # grid order; only the pairs whose boxes meet leave numpy
+            met = np.flatnonzero(np.isfinite(enter))
+            met = met[np.lexsort((query_order[met], enter[met], rows[met]))]
+            met_rows = rows[met]
+            pairs = zip(
+                moving[met_rows].tolist(),
+                ids[met].tolist(),
+                start[met_rows].tolist(),
+                step[met_rows].tolist(),
+                half_size[met_rows].tolist(),
+                enter[met].tolist(),
+                leave[met].tolist(),
+            )
+            for index, enemy_id, pair_start, pair_step, size, t_enter, t_leave in pairs:
+                if index in stopped:
+                    continue
+                enemy = enemies[enemy_id]
+                pierced = self.pierced.get(index)
+                if pierced and enemy in pierced:
+                    continue
+                if not self.narrow_phase(
+                    self.proxies[index].mask,
+                    size,
+                    enemy,
+                    pair_start,
+                    pair_step,
+                    t_enter,
+                    t_leave,
+                ):
+                    continue
+
+                hits.append(enemy)
+                if self.pierce[index]:
+                    self.pierce[index] -= 1
+                    self.pierced.setdefault(index, set()).add(enemy)
+                else:
+                    # stops at the point of impact
+                    stopped.add(index)
+                    self.pos[index] = (
+                        pair_start[0] + pair_step[0] * t_enter,
+                        pair_start[1] + pair_step[1] * t_enter,
+                    )
+
+        # drop spent projectiles
+        proxies = self.proxies
+        stopped.update(moving[self.lifetime[moving] <= 0].tolist())
+        for index in sorted(stopped):
+            proxies[index].kill()
+
+        # and move the proxies that are in view, or were the last time they moved
+        moving = moving[self.alive[moving]]
+        pos = self.pos[moving]
+        half_size = self.half_size[moving]
+        visible = (
+            (pos[:, 0] + half_size[:, 0] > view.left)
+            & (pos[:, 0] - half_size[:, 0] < view.right)
+            & (pos[:, 1] + half_size[:, 1] > view.top)
+            & (pos[:, 1] - half_size[:, 1] < view.bottom)
+        )
+        placed = visible | self.shown[moving]
+        self.shown[moving] = visible
+        for index, center in zip(moving[placed].tolist(), pos[placed].tolist()):
+            proxies[index].rect.center = center
+        return hits
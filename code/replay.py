@@ -0,0 +1,135 @@
+import json
+import struct
+
+import pygame
+
+MAGIC = b"VSRP"
+VERSION = 2
+
+# keys the simulation reads, one bit each in the per tick input mask
+RECORDED_KEYS = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d)
+
+# a recording holds one segment per level played: magic, version, header
+# size and run count, then the JSON header and the runs
+SEGMENT = struct.Struct("<4sHII")
+
+# runs of identical ticks: repeat count, input mask, dt
+RUN = struct.Struct("<IBd")
+
+
+class KeyState(dict):
+    # stands in for pygame.key.get_pressed(), unrecorded keys read as released
+    def __missing__(self, key):
+        return False
+
+
+def keys_from_mask(mask):
+    return KeyState(
+        {key: bool(mask & 1 << bit) for bit, key in enumerate(RECORDED_KEYS)}
+    )
+
+
+def mask_from_keys(keys):
+    mask = 0
+    for bit, key in enumerate(RECORDED_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+
+class LiveInput:
+    # the keyboard, read once per simulation tick
+    finished = False
+
+    def __init__(self):
+        self.keys = KeyState()
+
+    def tick(self, dt):
+        self.keys = pygame.key.get_pressed()
+        return dt
+
+    def get_pressed(self):
+        return self.keys
+
+
+class RecordingInput(LiveInput):
+    # the keyboard, plus a run length encoded log of every tick's input and dt
+    def __init__(self, header):
+        super().__init__()
+        self.header = header
+        self.runs = []
+
+    def tick(self, dt):
+        dt = super().tick(dt)
+        mask = mask_from_keys(self.keys)
+        if self.runs and self.runs[-1][1:] == [mask, dt]:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1, mask, dt])
+        return dt
+
+    def save(self, path, append=False):
+        # later levels of a session are appended after the first one
+        header = json.dumps(self.header).encode()
+        with open(path, "ab" if append else "wb") as f:
+            f.write(SEGMENT.pack(MAGIC, VERSION, len(header), len(self.runs)) + header)
+            for run in self.runs:
+                f.write(RUN.pack(*run))
+
+
+class ReplayInput:
+    # feeds a recording back tick by tick, including the recorded dt, so the
+    # simulation repeats exactly whatever frame rate it is rendered at; the
+    # levels of the session are played in the order they were recorded
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != MAGIC:
+            raise ValueError(f"{path} is not an input recording")
+
+        self.levels = []
+        offset = 0
+        while offset < len(data):
+            magic, version, header_size, run_count = SEGMENT.unpack_from(data, offset)
+            if magic != MAGIC:
+                raise ValueError(f"{path} has a damaged level at byte {offset}")
+            if version != VERSION:
+                raise ValueError(
+                    f"{path} has recording version {version}, expected {VERSION}"
+                )
+            offset += SEGMENT.size
+            header = json.loads(data[offset : offset + header_size])
+            offset += header_size
+            runs = list(RUN.iter_unpack(data[offset : offset + run_count * RUN.size]))
+            offset += run_count * RUN.size
+            self.levels.append((header, runs))
+
+        self.level_index = -1
+        self.next_level()
+
+    def next_level(self):
+        # move on to the next recorded level, False after the last one
+        if self.level_index + 1 >= len(self.levels):
+            return False
+        self.level_index += 1
+        self.header, self.runs = self.levels[self.level_index]
+        self.run_index = 0
+        self.run_ticks = 0
+        self.keys = KeyState()
+        self.finished = not self.runs
+        return True
+
+    def tick(self, dt):
+        if self.finished:
+            return None
+        count, mask, dt = self.runs[self.run_index]
+        self.keys = keys_from_mask(mask)
+        self.run_ticks += 1
+        if self.run_ticks == count:
+            self.run_index += 1
+            self.run_ticks = 0
+            self.finished = self.run_index == len(self.runs)
+        return dt
+
+    def get_pressed(self):
+        return self.keys
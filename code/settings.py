@@ -3,4 +3,25 @@ from os.path import join
 from os import walk
 
 WINDOW_WIDTH, WINDOW_HEIGHT = 1280,720
-TILE_SIZE = 64
\ No newline at end of file
+TILE_SIZE = 64
+
+# simulate enemies with the vectorized EnemySystem (needs numpy)
+NUMPY_ENEMIES = False
+
+# move and hit test bullets with the vectorized ProjectileSystem (needs numpy)
+NUMPY_PROJECTILES = False
+
+# enemies push away from up to SEPARATION_NEIGHBOURS others within
+# SEPARATION_RADIUS pixels, so crowds spread out instead of stacking
+SEPARATION_RADIUS = 64
+SEPARATION_NEIGHBOURS = 8
+SEPARATION_WEIGHT = 1.5
+
+# enemies further than LOD_MARGIN pixels outside the screen only update every
+# LOD_INTERVAL ticks, with the time they skipped
+LOD_MARGIN = TILE_SIZE * 2
+LOD_INTERVAL = 4
+
+# most enemies spawned in one tick, bigger batches spread over the next ticks
+# (0 = no limit)
+SPAWN_BUDGET = 4
\ No newline at end of file
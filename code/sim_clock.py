@@ -0,0 +1,12 @@
+class SimClock:
+    # simulation time owned by GameView; it only moves when the game updates,
+    # so timers behave the same at any frame rate, headless or faster than
+    # real time
+    def __init__(self):
+        self.time = 0.0
+
+    def tick(self, dt):
+        self.time += dt * 1000
+
+    def get_ticks(self):
+        return int(self.time)
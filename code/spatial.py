@@ -0,0 +1,46 @@
+from settings import *
+
+
+class SpatialHash:
+    # uniform grid bucketing items by the cells their rect covers, so overlap
+    # queries only look at nearby items instead of the whole set
+    def __init__(self, cell_size = TILE_SIZE * 2):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell_range(self, rect):
+        cell_size = self.cell_size
+        return (
+            int(rect.left // cell_size),
+            int(rect.top // cell_size),
+            int(rect.right // cell_size),
+            int(rect.bottom // cell_size),
+        )
+
+    def insert(self, item, rect):
+        left, top, right, bottom = self.cell_range(rect)
+        for cell_y in range(top, bottom + 1):
+            for cell_x in range(left, right + 1):
+                self.cells.setdefault((cell_x, cell_y), []).append(item)
+
+    def clear(self):
+        self.cells.clear()
+
+    def query_point(self, pos):
+        # items overlapping the one cell that contains pos, no deduplication
+        cell_size = self.cell_size
+        return self.cells.get((int(pos[0] // cell_size), int(pos[1] // cell_size)), ())
+
+    def query(self, rect):
+        left, top, right, bottom = self.cell_range(rect)
+        cells = self.cells
+        if left == right and top == bottom:
+            return cells.get((left, top), ())
+
+        # items spanning several cells show up once per cell
+        found = {}
+        for cell_y in range(top, bottom + 1):
+            for cell_x in range(left, right + 1):
+                for item in cells.get((cell_x, cell_y), ()):
+                    found[item] = None
+        return found
@@ -0,0 +1,71 @@
+from heapq import heappop, heappush, heapreplace
+
+
+class SpawnTimeline:
+    # a level compiled into a queue of events on the simulation clock: wave
+    # changes, and per wave the next batch of spawns, which re-queues the one
+    # after it when it fires. GameView only pops the events that are due, and
+    # at most `budget` spawns a tick (0 = no limit); the rest of a batch waits
+    # for the following ticks.
+    def __init__(self, level, budget=0):
+        self.waves = level.waves
+        self.budget = budget
+        self.events = []
+        self.sequence = 0
+
+        self.wave_index = 0
+        self.wave_start_time = 0
+        self.wave_end_times = []
+
+        start_time = 0
+        for index, wave in enumerate(self.waves):
+            if index:
+                self.push(start_time, index, 0)
+            end_time = start_time + wave.duration * 1000
+            self.wave_end_times.append(end_time)
+            # the level opens with a batch on its first tick; later waves
+            # carry on from the last spawn, one interval into the wave
+            first_time = start_time + wave.spawn_interval if index else 0
+            if wave.spawn_amount and first_time < end_time:
+                self.push(first_time, index, wave.spawn_amount)
+            start_time = end_time
+        # past the last wave
+        self.push(start_time, len(self.waves), 0)
+
+    def push(self, time, wave_index, amount):
+        # amount 0 marks the start of wave_index; the sequence number keeps
+        # events at the same time in the order they were queued
+        heappush(self.events, (time, self.sequence, wave_index, amount))
+        self.sequence += 1
+
+    @property
+    def finished(self):
+        return self.wave_index >= len(self.waves)
+
+    def due(self, now):
+        # the enemy types to spawn this tick
+        spawns = []
+        budget = self.budget
+        events = self.events
+        while events and events[0][0] <= now:
+            time, sequence, wave_index, amount = events[0]
+            if not amount:
+                heappop(events)
+                self.wave_index = wave_index
+                self.wave_start_time = time
+                continue
+
+            wave = self.waves[wave_index]
+            count = min(amount, budget - len(spawns)) if budget else amount
+            if not count:
+                break
+            spawns.extend([wave.enemy_type] * count)
+            if count < amount:
+                heapreplace(events, (time, sequence, wave_index, amount - count))
+                break
+
+            heappop(events)
+            next_time = time + max(1, wave.spawn_interval)
+            if next_time < self.wave_end_times[wave_index]:
+                self.push(next_time, wave_index, wave.spawn_amount)
+        return spawns
@@ -1,5 +1,10 @@
 from settings import *
 
+# the enemy's own grid cell first, then the eight around it
+NEIGHBOUR_CELLS = (
+    (0, 0), (-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1),
+)
+
 
 class Sprite(pygame.sprite.Sprite):
     def __init__(self, pos, surf, groups):
@@ -11,61 +16,166 @@ class Sprite(pygame.sprite.Sprite):
 
 class CollisionSprite(pygame.sprite.Sprite):
     def __init__(self, pos, surf, groups):
-        super().__init__(groups)
+        # join the groups only once the rect is set, AllSprites buckets static
+        # sprites by position when they are added
+        super().__init__()
         self.image = surf
         self.rect = self.image.get_frect(topleft=pos)
+        self.static = True
+        self.add(groups)
 
 
 class Bullet(pygame.sprite.Sprite):
-    def __init__(self, surf, pos, direction, groups):
-        super().__init__(groups)
-        self.image = surf
-        self.rect = self.image.get_frect(center=pos)
-        self.spawn_time = pygame.time.get_ticks()
+    # image and rect are properties on pygame's Sprite, so only our own
+    # attributes can live in slots
+    __slots__ = ("mask", "lifetime_timer", "lifetime", "direction", "speed", "pierce", "pierced", "pool")
+
+    def __init__(self, surf, mask, pos, direction, groups, timers, pierce=0):
+        super().__init__()
+        self.pool = None
         self.lifetime = 1000
+        self.speed = 600
+        self.reset(surf, mask, pos, direction, groups, timers, pierce)
 
+    def reset(self, surf, mask, pos, direction, groups, timers, pierce=0):
+        # pierce: how many more enemies it passes through before it stops
+        self.pierce = pierce
+        self.pierced = set()
+        self.image = surf
+        self.mask = mask
+        self.rect = self.image.get_frect(center=pos)
+        self.lifetime_timer = timers.schedule(self.lifetime, self.kill)
         self.direction = direction
-        self.speed = 600
+        self.add(groups)
+
+    def kill(self):
+        if self.alive():
+            # a bullet killed by a hit must not be killed again by its
+            # lifetime timer once the pool has handed it out anew
+            self.lifetime_timer.cancel()
+            super().kill()
+            if self.pool:
+                self.pool.release(self)
 
     def update(self, dt):
         self.rect.center += self.direction * self.speed * dt
 
-        if pygame.time.get_ticks() - self.spawn_time >= self.lifetime:
-            self.kill()
-
 
 class Enemy(pygame.sprite.Sprite):
-    def __init__(self, pos, frames, groups, player, collision_sprites):
-        super().__init__(groups)
+    __slots__ = (
+        "player", "frames", "frame_index", "masks", "death_surf", "mask", "animation_speed",
+        "hitbox_rect", "collision_grid", "enemy_grid", "flow_field", "timers", "direction", "speed",
+        "death_timer", "death_duration", "xp_value", "lod_slot", "lod_dt", "spawn_order", "pool",
+    )
+
+    def __init__(
+        self,
+        pos,
+        frames,
+        masks,
+        death_surf,
+        groups,
+        player,
+        collision_grid,
+        enemy_grid,
+        flow_field,
+        timers,
+    ):
+        super().__init__()
+        self.pool = None
+        self.animation_speed = 6
+        self.direction = pygame.Vector2()
+        self.speed = 200
+        self.death_duration = 400
+        self.xp_value = 10
+        self.reset(
+            pos,
+            frames,
+            masks,
+            death_surf,
+            groups,
+            player,
+            collision_grid,
+            enemy_grid,
+            flow_field,
+            timers,
+        )
+
+    def reset(
+        self,
+        pos,
+        frames,
+        masks,
+        death_surf,
+        groups,
+        player,
+        collision_grid,
+        enemy_grid,
+        flow_field,
+        timers,
+    ):
         self.player = player
 
         # image
         self.frames, self.frame_index = frames, 0
+        self.masks = masks
+        self.death_surf = death_surf
         self.image = self.frames[self.frame_index]
-        self.animation_speed = 6
+        self.mask = self.masks[self.frame_index]
 
         # rect
         self.rect = self.image.get_frect(center=pos)
         self.hitbox_rect = self.rect.inflate(-20, -40)
-        self.collision_sprites = collision_sprites
-        self.direction = pygame.Vector2()
-        self.speed = 200
+        self.collision_grid = collision_grid
+        self.enemy_grid = enemy_grid
+        self.flow_field = flow_field
+        self.timers = timers
 
-        # timer
-        self.death_time = 0
-        self.death_duration = 400
+        # timer, set while the death animation plays
+        self.death_timer = None
 
-        self.xp_value = 10
+        # level of detail, see GameView.update_enemies
+        self.lod_slot = 0
+        self.lod_dt = 0
+
+        # where separation starts walking a grid cell, set by GameView.spawn_enemy
+        self.spawn_order = 0
+
+        self.add(groups)
+
+    def kill(self):
+        if self.alive():
+            if self.death_timer:
+                self.death_timer.cancel()
+                self.death_timer = None
+            super().kill()
+            if self.pool:
+                self.pool.release(self)
 
     def animate(self, dt):
         self.frame_index += self.animation_speed * dt
-        self.image = self.frames[int(self.frame_index) % len(self.frames)]
+        index = int(self.frame_index) % len(self.frames)
+        self.image = self.frames[index]
+        self.mask = self.masks[index]
+
+    def steer(self, enemy_pos):
+        # follow the flow field around obstacles, straight at the player once
+        # in their cell
+        target_pos = self.flow_field.waypoint(enemy_pos)
+        if target_pos is None:
+            target_pos = pygame.Vector2(self.player.rect.center)
+        return (target_pos - enemy_pos).normalize()
 
     def move(self, dt):
         # get direction
-        player_pos = pygame.Vector2(self.player.rect.center)
-        enemy_pos = pygame.Vector2(self.rect.center)
-        self.direction = (player_pos - enemy_pos).normalize()
+        enemy_pos = pygame.Vector2(self.hitbox_rect.center)
+        direction = self.steer(enemy_pos)
+        separation = self.separation(enemy_pos)
+        if separation:
+            direction += separation * SEPARATION_WEIGHT
+            if direction:
+                direction.normalize_ip()
+        self.direction = direction
 
         # update the rect position + collision
         self.hitbox_rect.x += self.direction.x * self.speed * dt
@@ -74,8 +184,72 @@ class Enemy(pygame.sprite.Sprite):
         self.collision("vertical")
         self.rect.center = self.hitbox_rect.center
 
+    def move_far(self, dt):
+        # off screen: no separation, and a single obstacle query for the whole
+        # step, only sliding along obstacles when the step ends inside one
+        enemy_pos = pygame.Vector2(self.hitbox_rect.center)
+        self.direction = self.steer(enemy_pos)
+        step = self.direction * self.speed * dt
+        self.hitbox_rect.center = enemy_pos + step
+        for sprite in self.collision_grid.query(self.hitbox_rect):
+            if sprite.rect.colliderect(self.hitbox_rect):
+                self.hitbox_rect.center = enemy_pos
+                self.hitbox_rect.x += step.x
+                self.collision("horizontal")
+                self.hitbox_rect.y += step.y
+                self.collision("vertical")
+                break
+        self.rect.center = self.hitbox_rect.center
+
+    def separation(self, enemy_pos):
+        # push away from enemies within SEPARATION_RADIUS, looking at no more
+        # than SEPARATION_NEIGHBOURS others from the enemy grid of the last
+        # tick. The grid cells are wider than the radius, so the 3x3 cells
+        # around the enemy hold everyone close enough to matter; each cell is
+        # walked from a place picked by the enemy's spawn order, wrapping
+        # around, so a crowded cell isn't judged by the same first few members
+        # every time
+        push = pygame.Vector2()
+        radius_squared = SEPARATION_RADIUS * SEPARATION_RADIUS
+        cells = self.enemy_grid.cells
+        cell_size = self.enemy_grid.cell_size
+        cell_x = int(enemy_pos[0] // cell_size)
+        cell_y = int(enemy_pos[1] // cell_size)
+        spawn_order = self.spawn_order
+
+        neighbours = []
+        for offset_x, offset_y in NEIGHBOUR_CELLS:
+            cell = cells.get((cell_x + offset_x, cell_y + offset_y))
+            if not cell:
+                continue
+            size = len(cell)
+            start = spawn_order % size
+            for step in range(size):
+                enemy = cell[(start + step) % size]
+                # enemies on a cell border are in both cells
+                if enemy is self or enemy in neighbours:
+                    continue
+                neighbours.append(enemy)
+                center = enemy.hitbox_rect.center
+                distance_squared = enemy_pos.distance_squared_to(center)
+                if distance_squared == 0:
+                    # stacked exactly (say, wedged into the same corner): split
+                    # sideways, each way by spawn order
+                    push.x += (
+                        SEPARATION_RADIUS
+                        if enemy.spawn_order < spawn_order
+                        else -SEPARATION_RADIUS
+                    )
+                elif distance_squared < radius_squared:
+                    offset = enemy_pos - center
+                    distance = offset.length()
+                    push += offset * ((SEPARATION_RADIUS - distance) / distance)
+                if len(neighbours) == SEPARATION_NEIGHBOURS:
+                    return push / SEPARATION_RADIUS
+        return push / SEPARATION_RADIUS
+
     def collision(self, direction):
-        for sprite in self.collision_sprites:
+        for sprite in self.collision_grid.query(self.hitbox_rect):
             if sprite.rect.colliderect(self.hitbox_rect):
                 if direction == "horizontal":
                     if self.direction.x > 0:
@@ -90,19 +264,20 @@ class Enemy(pygame.sprite.Sprite):
 
     def destroy(self):
         # start a timer
-        self.death_time = pygame.time.get_ticks()
+        if self.death_timer:
+            self.death_timer.cancel()
+        self.death_timer = self.timers.schedule(self.death_duration, self.kill)
         # change the image
-        surf = pygame.mask.from_surface(self.frames[0]).to_surface()
-        surf.set_colorkey("black")
-        self.image = surf
-
-    def death_timer(self):
-        if pygame.time.get_ticks() - self.death_time >= self.death_duration:
-            self.kill()
+        self.image = self.death_surf
+        self.mask = self.masks[0]
 
     def update(self, dt):
-        if self.death_time == 0:
+        if self.death_timer is None:
             self.move(dt)
             self.animate(dt)
-        else:
-            self.death_timer()
+
+    def update_far(self, dt):
+        # the cheap update GameView.update_enemies runs for distant enemies,
+        # the animation only picks up again once they come close
+        if self.death_timer is None:
+            self.move_far(dt)
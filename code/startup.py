@@ -0,0 +1,61 @@
+import builtins
+import sys
+import threading
+import time
+
+
+class StartupReport:
+    # `-X importtime` style numbers from inside the game: how long each module
+    # took to import on its own and with everything it imported, then the
+    # time to the marked startup steps up to the first frame
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.thread = threading.get_ident()
+        self.imports = []
+        self.stack = []
+        self.marks = []
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # only first imports on the main thread; the preload thread imports
+        # game_view in the background
+        if level or name in sys.modules or threading.get_ident() != self.thread:
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        self.stack.append(0)
+        start = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += elapsed
+            self.imports.append((len(self.stack), name, elapsed - children, elapsed))
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter() - self.start))
+
+    def print(self):
+        builtins.__import__ = self.original_import
+
+        print("import time: self [us] | cumulative | imported package")
+        for depth, name, own, cumulative in self.imports:
+            print(
+                f"import time: {own * 1e6:>9.0f} | {cumulative * 1e6:>10.0f} | "
+                f"{'  ' * depth}{name}"
+            )
+
+        previous = 0
+        for name, elapsed in self.marks:
+            print(
+                f"startup: {name:<12}{(elapsed - previous) * 1000:>8.1f} ms"
+                f"{elapsed * 1000:>10.1f} ms total"
+            )
+            previous = elapsed
+
+
+# installed before main.py imports anything else, so the import times cover
+# the whole startup
+report = StartupReport() if "--startup-report" in sys.argv else None
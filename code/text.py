@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+
+class TextCache:
+    # least recently used cache of rendered text surfaces, keyed by
+    # (font, text, colour); fonts come from the asset cache so they compare
+    # by identity
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surf = self.surfaces.get(key)
+        if surf is None:
+            surf = font.render(text, True, color)
+            self.surfaces[key] = surf
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+text_cache = TextCache()
+
+
+class TextLabel:
+    # HUD text that only renders again when its value changes
+    def __init__(self, font, color):
+        self.font = font
+        self.color = color
+        self.text = None
+        self.surf = None
+
+    def render(self, text):
+        if text != self.text:
+            self.text = text
+            self.surf = self.font.render(text, True, self.color)
+        return self.surf
@@ -0,0 +1,71 @@
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+
+
+class Timer:
+    __slots__ = ("expires", "callback")
+
+    def __init__(self, expires, callback):
+        self.expires = expires
+        self.callback = callback
+
+    def cancel(self):
+        # left in its slot and skipped when the slot comes up
+        self.callback = None
+
+
+class TimerWheel:
+    # hierarchical timing wheel in simulation milliseconds: level 0 holds the
+    # timers due within the next 64 ms one slot per ms, each level above
+    # covers 64 times the span of the one below, and its slots are spread
+    # over the lower levels as time reaches them. advance() only visits the
+    # slots for the milliseconds that passed, so its cost follows the timers
+    # that fire, not the ones waiting.
+    def __init__(self, levels=4):
+        self.time = 0
+        self.wheels = [[[] for _ in range(SLOTS)] for _ in range(levels)]
+
+    def schedule(self, delay, callback):
+        timer = Timer(self.time + max(1, int(delay)), callback)
+        self.insert(timer)
+        return timer
+
+    def insert(self, timer):
+        delta = timer.expires - self.time
+        level = 0
+        while delta >= SLOTS << (level * SLOT_BITS) and level < len(self.wheels) - 1:
+            level += 1
+        # beyond the top level, park in its furthest slot and re-file later
+        expires = min(timer.expires, self.time + (SLOTS << (level * SLOT_BITS)) - 1)
+        slot = (expires >> (level * SLOT_BITS)) & SLOT_MASK
+        self.wheels[level][slot].append(timer)
+
+    def cascade(self, level):
+        # spread one slot of `level` over the levels below it
+        slot = (self.time >> (level * SLOT_BITS)) & SLOT_MASK
+        timers = self.wheels[level][slot]
+        self.wheels[level][slot] = []
+        for timer in timers:
+            if timer.callback is not None:
+                self.insert(timer)
+        return slot
+
+    def advance(self, now):
+        wheels = self.wheels
+        while self.time < now:
+            self.time += 1
+            slot = self.time & SLOT_MASK
+            if slot == 0:
+                level = 1
+                while level < len(wheels) and self.cascade(level) == 0:
+                    level += 1
+
+            timers = wheels[0][slot]
+            if timers:
+                wheels[0][slot] = []
+                for timer in timers:
+                    callback = timer.callback
+                    if callback is not None:
+                        timer.callback = None
+                        callback()
@@ -1,8 +1,13 @@
 import pygame
 from settings import WINDOW_WIDTH, WINDOW_HEIGHT
+from assets import assets
+from text import text_cache
 
 
 class State:
+    # idle states have nothing to animate, Game.run throttles them
+    idle = False
+
     def __init__(self, game):
         self.game = game
 
@@ -10,16 +15,59 @@ class State:
         pass
 
     def draw(self, surface):
+        # returns the rects to push to the display, None meaning all of it
+        pass
+
+    def enter(self):
         pass
 
+    def exit(self):
+        pass
+
+
+class MenuView(State):
+    # menus only change on input: render() runs when the view is dirty and
+    # returns the rects it drew, and only those (plus the ones from the
+    # previous render) are pushed to the display
+    idle = True
 
-class MainMenuView(State):
     def __init__(self, game):
         super().__init__(game)
-        self.font = pygame.font.Font(None, 50)
+        self.dirty = True
+        self.full_redraw = True
+        self.drawn_rects = []
+
+    def enter(self):
+        self.dirty = True
+        self.full_redraw = True
+
+    def render(self, surface):
+        return []
+
+    def draw(self, surface):
+        if not self.dirty:
+            return []
+        self.dirty = False
+
+        rects = self.render(surface)
+        dirty_rects, self.drawn_rects = self.drawn_rects + rects, rects
+        if self.full_redraw:
+            self.full_redraw = False
+            return None
+        return dirty_rects
+
+
+class MainMenuView(MenuView):
+    def __init__(self, game):
+        super().__init__(game)
+        self.font = assets.font(None, 50)
         self.options = ["Start Game", "Settings", "Skill Tree", "Quit"]
         self.selected_index = 0
 
+    def enter(self):
+        super().enter()
+        self.game.preload_level()
+
     def update(self, dt):
         # Handling continuous press might be too fast, stick to events in main or handle here?
         # Ideally input handling should be decoupled or passed in.
@@ -46,25 +94,27 @@ class MainMenuView(State):
         elif option == "Quit":
             self.game.running = False
 
-    def draw(self, surface):
+    def render(self, surface):
+        rects = []
         surface.fill("black")
         # Draw Title
-        title_surf = self.font.render("Vampire Survivor Clone", True, "red")
+        title_surf = text_cache.render(self.font, "Vampire Survivor Clone", "red")
         title_rect = title_surf.get_rect(center=(WINDOW_WIDTH / 2, 100))
-        surface.blit(title_surf, title_rect)
+        rects.append(surface.blit(title_surf, title_rect))
 
         # Draw Options
         for index, option in enumerate(self.options):
             color = "white" if index == self.selected_index else "grey"
-            text_surf = self.font.render(option, True, color)
+            text_surf = text_cache.render(self.font, option, color)
             text_rect = text_surf.get_rect(center=(WINDOW_WIDTH / 2, 250 + index * 60))
-            surface.blit(text_surf, text_rect)
+            rects.append(surface.blit(text_surf, text_rect))
+        return rects
 
 
-class SettingsView(State):
+class SettingsView(MenuView):
     def __init__(self, game):
         super().__init__(game)
-        self.font = pygame.font.Font(None, 40)
+        self.font = assets.font(None, 40)
         self.options = ["Music Volume", "SFX Volume", "Back"]
         self.selected_index = 0
 
@@ -96,13 +146,14 @@ class SettingsView(State):
             self.game.sfx_volume = max(0.0, min(1.0, self.game.sfx_volume + amount))
         self.game.save_settings()
 
-    def draw(self, surface):
+    def render(self, surface):
+        rects = []
         surface.fill("navy")
 
         # Title
-        title_surf = self.font.render("Settings", True, "white")
+        title_surf = text_cache.render(self.font, "Settings", "white")
         title_rect = title_surf.get_rect(center=(WINDOW_WIDTH / 2, 100))
-        surface.blit(title_surf, title_rect)
+        rects.append(surface.blit(title_surf, title_rect))
 
         # Options
         for index, option in enumerate(self.options):
@@ -115,57 +166,64 @@ class SettingsView(State):
             else:
                 text = option
 
-            text_surf = self.font.render(text, True, color)
+            text_surf = text_cache.render(self.font, text, color)
             text_rect = text_surf.get_rect(center=(WINDOW_WIDTH / 2, 250 + index * 60))
-            surface.blit(text_surf, text_rect)
+            rects.append(surface.blit(text_surf, text_rect))
 
-        help_surf = self.font.render(
-            "Use Arrow Keys to Navigate and Adjust", True, "white"
+        help_surf = text_cache.render(
+            self.font, "Use Arrow Keys to Navigate and Adjust", "white"
         )
         help_rect = help_surf.get_rect(center=(WINDOW_WIDTH / 2, WINDOW_HEIGHT - 50))
-        surface.blit(help_surf, help_rect)
+        rects.append(surface.blit(help_surf, help_rect))
+        return rects
 
 
-class SkillTreeView(State):
+class SkillTreeView(MenuView):
     def __init__(self, game):
         super().__init__(game)
-        self.font = pygame.font.Font(None, 40)
+        self.font = assets.font(None, 40)
 
     def handle_event(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
                 self.game.change_state("main_menu")
 
-    def draw(self, surface):
+    def render(self, surface):
+        rects = []
         surface.fill("darkgreen")
-        text_surf = self.font.render("Skill Tree - Press ESC to return", True, "white")
+        text_surf = text_cache.render(
+            self.font, "Skill Tree - Press ESC to return", "white"
+        )
         text_rect = text_surf.get_rect(center=(WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2))
-        surface.blit(text_surf, text_rect)
+        rects.append(surface.blit(text_surf, text_rect))
+        return rects
 
 
-class DeathView(State):
+class DeathView(MenuView):
     def __init__(self, game):
         super().__init__(game)
-        self.font = pygame.font.Font(None, 50)
+        self.font = assets.font(None, 50)
 
     def handle_event(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_SPACE:
                 self.game.change_state("main_menu")
 
-    def draw(self, surface):
+    def render(self, surface):
+        rects = []
         surface.fill("darkred")
-        text_surf = self.font.render(
-            "You Died! Press SPACE to return to Menu", True, "white"
+        text_surf = text_cache.render(
+            self.font, "You Died! Press SPACE to return to Menu", "white"
         )
         text_rect = text_surf.get_rect(center=(WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2))
-        surface.blit(text_surf, text_rect)
+        rects.append(surface.blit(text_surf, text_rect))
+        return rects
 
 
-class ShopView(State):
+class ShopView(MenuView):
     def __init__(self, game):
         super().__init__(game)
-        self.font = pygame.font.Font(None, 40)
+        self.font = assets.font(None, 40)
         self.options = [
             {"name": "Heal (50 pts)", "cost": 50, "action": "heal"},
             {"name": "Max HP (+20) (100 pts)", "cost": 100, "action": "max_hp"},
@@ -174,6 +232,10 @@ class ShopView(State):
         ]
         self.selected_index = 0
 
+    def enter(self):
+        super().enter()
+        self.game.preload_level()
+
     def handle_event(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_UP:
@@ -221,15 +283,16 @@ class ShopView(State):
             # Maybe play "cannot buy" sound
             pass
 
-    def draw(self, surface):
+    def render(self, surface):
+        rects = []
         surface.fill("indigo")
 
         # Title
-        title_surf = self.font.render(
-            f"Shop - Points: {self.game.points}", True, "gold"
+        title_surf = text_cache.render(
+            self.font, f"Shop - Points: {self.game.points}", "gold"
         )
         title_rect = title_surf.get_rect(center=(WINDOW_WIDTH / 2, 100))
-        surface.blit(title_surf, title_rect)
+        rects.append(surface.blit(title_surf, title_rect))
 
         # Options
         for index, option in enumerate(self.options):
@@ -237,6 +300,7 @@ class ShopView(State):
             if self.game.points < option["cost"]:
                 color = "red" if index == self.selected_index else "darkred"
 
-            text_surf = self.font.render(option["name"], True, color)
+            text_surf = text_cache.render(self.font, option["name"], color)
             text_rect = text_surf.get_rect(center=(WINDOW_WIDTH / 2, 250 + index * 60))
-            surface.blit(text_surf, text_rect)
+            rects.append(surface.blit(text_surf, text_rect))
+        return rects